@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser, UploadedFile, Deployment
+from .models import CustomUser, UploadedFile, Deployment, RuntimeLayer, DeploymentJob
 
 class CustomUserAdmin(UserAdmin):
     model = CustomUser
@@ -12,12 +12,23 @@ class UploadedFileAdmin(admin.ModelAdmin):
 
 @admin.register(Deployment)
 class DeploymentAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user', 'config_file_path', 'endpoint', 'deployed_at', 'status')
+    list_display = ('id', 'user', 'config_file_path', 'endpoint', 'deployed_at', 'status', 'runtime_mode', 'runtime_layer')
     search_fields = ('user__username', 'endpoint')
-    list_filter = ('status',)
+    list_filter = ('status', 'runtime_mode')
 
     def config_file_path(self, obj):
         return obj.config_file.file.name
     config_file_path.short_description = 'Config File'
 
+@admin.register(RuntimeLayer)
+class RuntimeLayerAdmin(admin.ModelAdmin):
+    list_display = ('id', 'layer_name', 'version', 'package_digest', 'published_at')
+    search_fields = ('layer_name', 'version_arn')
+
+@admin.register(DeploymentJob)
+class DeploymentJobAdmin(admin.ModelAdmin):
+    list_display = ('task_id', 'kind', 'user', 'target', 'state', 'stage', 'created_at', 'finished_at')
+    search_fields = ('task_id', 'user__username', 'target')
+    list_filter = ('kind', 'state')
+
 admin.site.register(CustomUser, CustomUserAdmin)
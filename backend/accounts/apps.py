@@ -2,4 +2,8 @@ from django.apps import AppConfig
 
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'backend.accounts'
\ No newline at end of file
+    name = 'backend.accounts'
+
+    def ready(self):
+        # Connects the signal handlers that track per-user change versions
+        from . import versions  # noqa: F401
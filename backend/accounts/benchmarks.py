@@ -0,0 +1,37 @@
+import json
+import os
+from django.db import connections
+from django.test.utils import setup_databases
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of values, or None when there are none."""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(q / 100 * len(values)) - 1))]
+
+
+def setup_bench_database(workdir, keepdb=False):
+    """
+    Creates the throwaway test database the benchmark commands run in and returns the config
+    to pass to teardown_databases. With keepdb an existing one (and its seeded data) is reused.
+    """
+    settings_dict = connections['default'].settings_dict
+    if connections['default'].vendor == 'sqlite' and not settings_dict['TEST'].get('NAME'):
+        # Benchmarks run requests or tasks on several threads, which need a database they can all
+        # open; the default in-memory test database is per connection
+        settings_dict['TEST']['NAME'] = os.path.join(workdir, 'bench.sqlite3')
+        # and they write at once; wait for the lock instead of failing after the default 5s
+        settings_dict['OPTIONS'].setdefault('timeout', 30)
+    return setup_databases(verbosity=0, interactive=False, keepdb=keepdb, aliases={'default'})
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+def save_baseline(path, report):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
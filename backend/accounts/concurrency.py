@@ -0,0 +1,99 @@
+import logging
+import random
+import time
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+class ConcurrencySlots:
+    """
+    Counting semaphore shared by every worker through the Django cache.
+
+    Each holder owns one numbered slot key with a lease, so a worker that dies
+    mid-task only blocks its slot until the lease runs out.
+    """
+
+    def __init__(self, name, limit, lease):
+        self.name = name
+        self.limit = limit
+        self.lease = lease
+
+    def _keys(self):
+        return [f"slots:{self.name}:{index}" for index in range(self.limit)]
+
+    def acquire(self, holder):
+        """Claims a free slot for holder. Returns False when all slots are taken."""
+        keys = self._keys()
+        taken = cache.get_many(keys)
+        for key in keys:
+            if taken.get(key) == holder:
+                return True
+        for key in keys:
+            if key not in taken and cache.add(key, holder, timeout=self.lease):
+                return True
+        return False
+
+    def release(self, holder):
+        keys = self._keys()
+        taken = cache.get_many(keys)
+        for key in keys:
+            if taken.get(key) == holder:
+                cache.delete(key)
+
+
+def acquire_all(slots, holder):
+    """Claims a slot in every one of slots, or none of them."""
+    acquired = []
+    for slot in slots:
+        if not slot.acquire(holder):
+            for held in acquired:
+                held.release(holder)
+            return False
+        acquired.append(slot)
+    return True
+
+
+def release_all(slots, holder):
+    for slot in slots:
+        slot.release(holder)
+
+
+class TokenBucket:
+    """
+    Request rate limit shared by every worker through the Django cache.
+
+    The bucket holds burst tokens and is refilled in full every burst / rate seconds, so the
+    long-run rate is rate per second. Each refill period has its own counter, which makes
+    taking a token a single atomic incr.
+    """
+
+    def __init__(self, name, rate, burst=None):
+        self.name = name
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self.period = self.burst / rate
+
+    def try_acquire(self):
+        """Takes a token and returns 0, or returns the seconds until the bucket refills."""
+        now = time.time()
+        period = int(now // self.period)
+        key = f"bucket:{self.name}:{period}"
+        cache.add(key, 0, timeout=int(self.period) + 60)
+        if cache.incr(key) <= self.burst:
+            return 0
+        return (period + 1) * self.period - now
+
+    def acquire(self):
+        """Blocks until a token is available. Returns the seconds spent waiting."""
+        waited = 0
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                if waited:
+                    logger.info(f"Waited {waited:.2f}s for a {self.name} token")
+                return waited
+            # Jitter so waiters don't all hit the next period at the same instant
+            wait += random.uniform(0, self.period / 10)
+            time.sleep(wait)
+            waited += wait
@@ -0,0 +1,72 @@
+import logging
+import os
+import threading
+import time
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+INDEX_TTL = float(os.environ.get('API_RESOURCE_INDEX_TTL', 300))
+PAGE_SIZE = 500  # API Gateway's maximum for get_resources
+
+
+class ResourceIndex:
+    """
+    Path -> resource map for each REST API, built from every page of get_resources.
+
+    Indexes are kept in process memory and in the shared cache, so one listing serves every
+    task on every worker. A per-API version number in the shared cache is bumped on
+    invalidation, which makes all processes rebuild on their next lookup.
+    """
+
+    def __init__(self, ttl=INDEX_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._local = {}  # api_id -> (version, built_at, index)
+
+    def _version_key(self, api_id):
+        return f"api-resources:{api_id}:version"
+
+    def _index_key(self, api_id, version):
+        return f"api-resources:{api_id}:{version}"
+
+    def _build(self, api_client, api_id):
+        index = {}
+        paginator = api_client.get_paginator('get_resources')
+        for page in paginator.paginate(restApiId=api_id, PaginationConfig={'PageSize': PAGE_SIZE}):
+            for item in page['items']:
+                index[item['path']] = item
+        logger.info(f"Indexed {len(index)} API Gateway resources for {api_id}")
+        return index
+
+    def _index(self, api_client, api_id, rebuild=False):
+        version = cache.get(self._version_key(api_id), 0)
+        now = time.monotonic()
+        local = self._local.get(api_id)
+        if not rebuild and local and local[0] == version and now - local[1] < self.ttl:
+            return local[2]
+
+        index = None if rebuild else cache.get(self._index_key(api_id, version))
+        if index is None:
+            index = self._build(api_client, api_id)
+            cache.set(self._index_key(api_id, version), index, timeout=self.ttl)
+        with self._lock:
+            self._local[api_id] = (version, now, index)
+        return index
+
+    def get(self, api_client, api_id, path, refresh_on_miss=False):
+        """Returns the resource at path, or None. With refresh_on_miss, a miss re-lists the API once in case the index is stale."""
+        item = self._index(api_client, api_id).get(path)
+        if item is None and refresh_on_miss:
+            item = self._index(api_client, api_id, rebuild=True).get(path)
+        return item
+
+    def invalidate(self, api_id):
+        """Call after creating or deleting resources so every process re-lists the API."""
+        cache.add(self._version_key(api_id), 0, timeout=None)
+        cache.incr(self._version_key(api_id))
+        with self._lock:
+            self._local.pop(api_id, None)
+
+
+resource_index = ResourceIndex()
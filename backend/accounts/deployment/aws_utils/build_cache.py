@@ -0,0 +1,230 @@
+import base64
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from collections import namedtuple
+from zipfile import ZipInfo, ZIP_DEFLATED
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the layout of the assembled artifact changes so stale entries are never reused
+ARTIFACT_LAYOUT_VERSION = 'v1'
+
+DEFAULT_CACHE_DIR = os.environ.get('DEPLOY_BUILD_CACHE_DIR', '/tmp/deploy_build_cache')
+DEFAULT_CACHE_MAX_BYTES = int(os.environ.get('DEPLOY_BUILD_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+CHUNK_SIZE = 1024 * 1024
+INLINE_ZIP_MAX_BYTES = 50 * 1024 * 1024  # Lambda's limit for direct ZipFile uploads
+
+# Fixed entry timestamp so identical inputs always assemble to byte-identical archives
+ZIP_ENTRY_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+# path: location of the zip in the cache, code_sha256: base64 sha256 as reported by Lambda's CodeSha256,
+# file: the zip opened for reading. Other workers may evict the entry at any time; the open handle
+# keeps its contents readable until it is closed (or the artifact is garbage collected).
+Artifact = namedtuple('Artifact', ['key', 'path', 'code_sha256', 'size', 'file'])
+
+
+def sha256_hexdigest(path):
+    """Returns the hex sha256 of a file, read in fixed-size chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def chunks_hexdigest(chunks):
+    """Returns the hex sha256 of an iterable of byte chunks without buffering them."""
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def lambda_code_sha256(path):
+    """Returns the digest of a zip in the same format Lambda reports as CodeSha256."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return base64.b64encode(digest.digest()).decode('ascii')
+
+
+def zip_entry(arcname):
+    """Returns a ZipInfo with fixed metadata for deterministic archives."""
+    info = ZipInfo(arcname, date_time=ZIP_ENTRY_DATE_TIME)
+    info.compress_type = ZIP_DEFLATED
+    info.external_attr = 0o644 << 16
+    return info
+
+
+def read_artifact(artifact):
+    """Loads an artifact into memory for an inline ZipFile upload."""
+    artifact.file.seek(0)
+    return artifact.file.read()
+
+
+def artifact_code(artifact, s3_client):
+    """
+    Returns the Code arguments for create_function/update_function_code.
+
+    With LAMBDA_ARTIFACT_BUCKET set, the artifact is uploaded to S3 in multipart chunks (once per
+    content key) so worker memory stays bounded; otherwise it is loaded for an inline upload.
+    """
+    bucket = os.environ.get('LAMBDA_ARTIFACT_BUCKET')
+    if bucket:
+        s3_key = f"lambda-artifacts/{artifact.key}.zip"
+        try:
+            s3_client.head_object(Bucket=bucket, Key=s3_key)
+            logger.info(f"Artifact already uploaded to s3://{bucket}/{s3_key}")
+        except ClientError:
+            artifact.file.seek(0)
+            s3_client.upload_fileobj(artifact.file, bucket, s3_key)
+            logger.info(f"Uploaded artifact to s3://{bucket}/{s3_key}")
+        return {'S3Bucket': bucket, 'S3Key': s3_key}
+    if artifact.size > INLINE_ZIP_MAX_BYTES:
+        raise ValueError("Deployment package exceeds the inline upload limit. Set LAMBDA_ARTIFACT_BUCKET.")
+    return {'ZipFile': read_artifact(artifact)}
+
+
+class BuildCache:
+    """
+    Content-addressed, size-bounded cache of assembled Lambda deployment packages.
+
+    Entries are keyed by (base package digest, config digest) and evicted least
+    recently used first once the cache grows past max_bytes.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._base_digests = {}
+
+    def base_digest(self, path):
+        """Digest of the base package, memoized on (mtime, size) so it is hashed once per change."""
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        cached = self._base_digests.get(path)
+        if cached and cached[0] == signature:
+            return cached[1]
+        digest = sha256_hexdigest(path)
+        self._base_digests[path] = (signature, digest)
+        return digest
+
+    def key(self, base_digest, config_digest):
+        return hashlib.sha256(f"{ARTIFACT_LAYOUT_VERSION}:{base_digest}:{config_digest}".encode()).hexdigest()
+
+    def _zip_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.zip")
+
+    def _sha_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.sha256")
+
+    def get(self, key):
+        """
+        Returns the cached artifact for key, with its zip open, or None on a miss. An entry another
+        worker is evicting or still publishing (zip without its .sha256) counts as a miss.
+        """
+        zip_path = self._zip_path(key)
+        file = None
+        try:
+            file = open(zip_path, 'rb')
+            with open(self._sha_path(key), 'r') as f:
+                code_sha256 = f.read().strip()
+        except FileNotFoundError:
+            if file:
+                file.close()
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            os.utime(zip_path)  # Mark as recently used for eviction
+        except FileNotFoundError:
+            pass  # Evicted since it was opened; the handle still reads it
+        with self._lock:
+            self.hits += 1
+        return Artifact(key, zip_path, code_sha256, os.fstat(file.fileno()).st_size, file)
+
+    def put(self, key, build, workspace=None):
+        """
+        Runs build(staging_path) and atomically publishes the result under key.
+        The artifact is staged in workspace when given, which must be on the cache's filesystem.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        staging_path = os.path.join(workspace or self.cache_dir, f".{key}.{uuid.uuid4().hex}.tmp")
+        sha_staging_path = os.path.join(self.cache_dir, f".{key}.{uuid.uuid4().hex}.sha256.tmp")
+        try:
+            build(staging_path)
+            code_sha256 = lambda_code_sha256(staging_path)
+            with open(sha_staging_path, 'w') as f:
+                f.write(code_sha256)
+            # Opened before publishing, so an eviction by another worker can't take it from under us
+            file = open(staging_path, 'rb')
+            # The digest goes in last: get() treats a zip without one as not yet published
+            os.replace(staging_path, self._zip_path(key))
+            os.replace(sha_staging_path, self._sha_path(key))
+        finally:
+            for path in (staging_path, sha_staging_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        artifact = Artifact(key, self._zip_path(key), code_sha256, os.fstat(file.fileno()).st_size, file)
+        self.evict(keep=key)
+        return artifact
+
+    def get_or_build(self, key, build, workspace=None):
+        artifact = self.get(key)
+        if artifact:
+            logger.info(f"Build cache hit for {key[:12]} ({artifact.size} bytes)")
+            return artifact
+        logger.info(f"Build cache miss for {key[:12]}, assembling artifact")
+        return self.put(key, build, workspace=workspace)
+
+    def evict(self, keep=None):
+        """Removes least recently used entries until the cache fits in max_bytes."""
+        try:
+            entries = [
+                entry for entry in os.scandir(self.cache_dir)
+                if entry.name.endswith('.zip') and not entry.name.startswith('.')
+            ]
+        except FileNotFoundError:
+            return
+        # Other workers evict from the same directory, so any entry may vanish between scandir and stat
+        stats = []
+        for entry in entries:
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            stats.append((stat.st_mtime, stat.st_size, entry))
+        stats.sort(key=lambda item: item[0])
+        total = sum(size for _, size, _ in stats)
+        for _, size, entry in stats:
+            if total <= self.max_bytes:
+                break
+            key = entry.name[:-len('.zip')]
+            if key == keep:
+                continue
+            for path in (entry.path, self._sha_path(key)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+            with self._lock:
+                self.evictions += 1
+            logger.info(f"Evicted build cache entry {key[:12]} ({size} bytes)")
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+
+build_cache = BuildCache()
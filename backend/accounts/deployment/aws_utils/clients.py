@@ -0,0 +1,138 @@
+import logging
+import os
+import threading
+import time
+import boto3
+from botocore import xform_name
+from botocore.config import Config
+from backend.accounts.concurrency import TokenBucket
+from backend.accounts.metrics import AWS_CALL_SECONDS, AWS_THROTTLES
+
+logger = logging.getLogger(__name__)
+
+MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', 10))
+# 'adaptive' rate-limits each client on the client side once AWS starts throttling it
+RETRY_MODE = os.environ.get('AWS_RETRY_MODE', 'adaptive')
+MAX_ATTEMPTS = int(os.environ.get('AWS_MAX_ATTEMPTS', 8))
+
+# Account-wide budgets (requests/second) for mutating control-plane calls, shared by all workers.
+# Keep them below the account's Lambda and API Gateway quotas; 0 disables the limit.
+CONTROL_PLANE_RATES = {
+    'lambda': float(os.environ.get('LAMBDA_CONTROL_PLANE_RATE', 10)),
+    'apigateway': float(os.environ.get('APIGATEWAY_CONTROL_PLANE_RATE', 5)),
+}
+MUTATING_PREFIXES = ('Create', 'Update', 'Delete', 'Put', 'Add', 'Remove', 'Publish', 'Tag', 'Untag')
+THROTTLE_CODES = ('Throttling', 'ThrottlingException', 'TooManyRequestsException', 'RequestLimitExceeded', 'SlowDown')
+
+
+def control_plane_limiter(service_name):
+    """Returns a before-call handler that takes a token from the service's shared bucket for mutating calls."""
+    bucket = TokenBucket(f"aws:{service_name}", CONTROL_PLANE_RATES[service_name])
+
+    def before_call(model, **kwargs):
+        if model.name.startswith(MUTATING_PREFIXES):
+            bucket.acquire()
+
+    return before_call
+
+
+def register_call_metrics(client, service_name):
+    """Records latency per operation (across botocore's retries) and every throttled attempt."""
+
+    def before_call(model, context, **kwargs):
+        # Registered after the limiter, so time spent waiting for a token is not counted
+        context['metrics_operation'] = xform_name(model.name)
+        context['metrics_started'] = time.monotonic()
+
+    def observe(context, outcome):
+        started = context.get('metrics_started')
+        if started is not None:
+            AWS_CALL_SECONDS.labels(service_name, context['metrics_operation'], outcome).observe(time.monotonic() - started)
+
+    def after_call(context, parsed=None, **kwargs):
+        observe(context, 'error' if parsed and 'Error' in parsed else 'ok')
+
+    def after_call_error(context, **kwargs):
+        observe(context, 'error')
+
+    def needs_retry(response, operation, **kwargs):
+        if response and response[1].get('Error', {}).get('Code') in THROTTLE_CODES:
+            AWS_THROTTLES.labels(service_name, xform_name(operation.name)).inc()
+
+    client.meta.events.register('before-call', before_call)
+    client.meta.events.register('after-call', after_call)
+    client.meta.events.register('after-call-error', after_call_error)
+    client.meta.events.register('needs-retry', needs_retry)
+
+
+class ClientRegistry:
+    """
+    Process-wide boto3 session and clients, shared across tasks.
+
+    Creating a client loads botocore models, resolves credentials and opens a new
+    connection pool, so each (service, region) client is built once per process.
+    Clients are thread-safe once built; building them is serialized by a lock.
+    The registry resets itself after a fork so children never reuse the parent's pools.
+    """
+
+    def __init__(self, max_pool_connections=MAX_POOL_CONNECTIONS):
+        self.max_pool_connections = max_pool_connections
+        self._lock = threading.Lock()
+        self._pid = None
+        self._session = None
+        self._clients = {}
+        self._handlers = []
+
+    def reset(self):
+        with self._lock:
+            self._pid = os.getpid()
+            self._session = boto3.session.Session()
+            self._clients = {}
+
+    def client(self, service_name, region_name=None):
+        region_name = region_name or os.environ.get('AWS_REGION')
+        key = (service_name, region_name)
+        if self._pid == os.getpid():
+            client = self._clients.get(key)
+            if client is not None:
+                return client
+        else:
+            self.reset()
+
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self._session.client(
+                    service_name,
+                    region_name=region_name,
+                    config=Config(
+                        max_pool_connections=self.max_pool_connections,
+                        retries={'mode': RETRY_MODE, 'max_attempts': MAX_ATTEMPTS},
+                    ),
+                )
+                if CONTROL_PLANE_RATES.get(service_name):
+                    client.meta.events.register('before-call', control_plane_limiter(service_name))
+                register_call_metrics(client, service_name)
+                for event_name, handler in self._handlers:
+                    client.meta.events.register(event_name, handler)
+                self._clients[key] = client
+                logger.info(f"Created pooled {service_name} client for region {region_name}")
+            return client
+
+    def register(self, event_name, handler):
+        """Registers a botocore event handler on every client, including ones already built."""
+        with self._lock:
+            self._handlers.append((event_name, handler))
+            for client in self._clients.values():
+                client.meta.events.register(event_name, handler)
+
+    def warm(self, service_names, region_name=None):
+        for service_name in service_names:
+            self.client(service_name, region_name)
+
+
+registry = ClientRegistry()
+
+def get_client(service_name, region_name=None):
+    """Returns the shared client for service_name in this process."""
+    return registry.client(service_name, region_name)
@@ -0,0 +1,30 @@
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Where router mode publishes bot configs; read by runtime/router_handler.py
+CONFIG_PREFIX = os.environ.get('ROUTER_CONFIG_PREFIX', 'router-configs/')
+
+def config_bucket():
+    bucket = os.environ.get('ROUTER_CONFIG_BUCKET') or os.environ.get('AWS_STORAGE_BUCKET_NAME')
+    if not bucket:
+        raise ValueError("ROUTER_CONFIG_BUCKET or AWS_STORAGE_BUCKET_NAME environment variable is not set.")
+    return bucket
+
+def config_key(user_id, bot_name):
+    return f"{CONFIG_PREFIX}user_{user_id}/{bot_name}/config.yaml"
+
+def publish_config(s3_client, user_id, bot_name, config_file):
+    """Streams the bot's config into the config store; the router picks it up on its next revalidation."""
+    bucket = config_bucket()
+    key = config_key(user_id, bot_name)
+    config_file.seek(0)
+    s3_client.upload_fileobj(config_file, bucket, key)
+    logger.info(f"Published config for user {user_id}, bot {bot_name} to s3://{bucket}/{key}")
+
+def unpublish_config(s3_client, user_id, bot_name):
+    bucket = config_bucket()
+    key = config_key(user_id, bot_name)
+    s3_client.delete_object(Bucket=bucket, Key=key)
+    logger.info(f"Removed config for user {user_id}, bot {bot_name} from s3://{bucket}/{key}")
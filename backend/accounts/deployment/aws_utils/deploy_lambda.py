@@ -1,14 +1,21 @@
-import boto3
 import os
 import shutil
 import yaml
 from zipfile import ZipFile
 from celery import shared_task
 import logging
-import time
 from botocore.exceptions import ClientError
 from tenacity import retry, stop_after_attempt, wait_exponential
 from backend.accounts.models import Deployment
+from backend.accounts.progress import DeployProgress
+from .build_cache import build_cache, artifact_code, chunks_hexdigest, zip_entry
+from .workspace import task_workspace, track_peak_memory
+from .clients import get_client
+from .waiters import wait_for_function_ready
+from .stage_deployments import request_stage_deployment
+from .api_resources import resource_index
+from .runtime_layer import ensure_runtime_layer
+from .config_store import config_bucket, publish_config, CONFIG_PREFIX
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -17,165 +24,170 @@ logger = logging.getLogger(__name__)
 current_script_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_script_dir)
 deployment_package_path = os.path.join(parent_dir, "deployment_package.zip")
+bot_handler_path = os.path.join(parent_dir, "runtime", "bot_handler.py")
+router_handler_path = os.path.join(parent_dir, "runtime", "router_handler.py")
 
-def wait_for_update_to_complete(lambda_client, function_name):
-    """Polls the Lambda function's status and waits for any ongoing updates to complete."""
-    max_attempts = 12  # Total 120 seconds wait time
-    attempts = 0
-    while attempts < max_attempts:
-        response = lambda_client.get_function(FunctionName=function_name)
-        update_status = response['Configuration'].get('LastUpdateStatus', 'Successful')
-        if update_status != 'InProgress':
-            logger.info(f"Update complete. LastUpdateStatus: {update_status}")
-            return
-        logger.info(f"Update in progress, waiting... (Attempt {attempts+1}/{max_attempts})")
-        time.sleep(10)  # Polling interval
-        attempts += 1
-    raise TimeoutError("Max polling attempts reached. Lambda function update did not complete in time.")
+CONFIG_ARCNAME = os.path.join("app", "config", "config.yaml")
+LAMBDA_TIMEOUT = 30
+BUNDLED_HANDLER = 'lambda_function.handler'
+SHIM_HANDLER = 'bot_handler.handler'
+ROUTER_HANDLER = 'router_handler.handler'
+ROUTER_FUNCTION_NAME = os.environ.get('LAMBDA_ROUTER_FUNCTION_NAME', 'chatbot_router')
 
+# Signature of the router last verified by this worker process, see ensure_router
+_router_state = {}
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-def update_lambda_function(lambda_client, function_name, zip_file, environment_vars):
-    """Updates Lambda function code and configuration with retry mechanism."""
-    wait_for_update_to_complete(lambda_client, function_name)
-    lambda_client.update_function_code(FunctionName=function_name, ZipFile=zip_file)
-    wait_for_update_to_complete(lambda_client, function_name)
-    lambda_client.update_function_configuration(
-        FunctionName=function_name,
-        Environment={'Variables': environment_vars},
-        Timeout=30  # Set timeout to 30 seconds
-    )
-    wait_for_update_to_complete(lambda_client, function_name)
-
-@shared_task(bind=True)
-def deploy_user_app(self, user_id, temp_file_path, chat_configuration_name):
-    try:
-        logger.info(f"Starting deployment for user_id: {user_id}, temp_file_path: {temp_file_path}")
-        environment = os.environ.get('DJANGO_ENV', 'development')
-        logger.info(f"Environment: {environment}")
-
-        aws_region = os.environ.get('AWS_REGION')
-        lambda_role = os.environ.get('LAMBDA_EXECUTION_ROLE')
-        if not aws_region or not lambda_role:
-            raise ValueError("AWS_REGION or LAMBDA_EXECUTION_ROLE environment variable is not set.")
-
-        # Create a temporary working directory
-        user_dir = f"/tmp/{user_id}"
-        os.makedirs(user_dir, exist_ok=True)
+def write_config_entry(zipf, config_file):
+    """Streams the config file's chunks into the archive as app/config/config.yaml."""
+    with zipf.open(zip_entry(CONFIG_ARCNAME), 'w') as dst:
+        for chunk in config_file.chunks():
+            dst.write(chunk)
 
-        # Step 1: Copy the deployment package to the temporary directory
-        temp_package_path = os.path.join(user_dir, "deployment_package.zip")
-        shutil.copyfile(deployment_package_path, temp_package_path)
-        logger.info(f"Copied deployment package to {temp_package_path}")
+def assemble_artifact(config_file, workspace=None):
+    """
+    Returns the deployment package with the user's config added, reusing the build cache when possible.
 
-        # Step 2: Add the config file to the deployment package
-        with ZipFile(temp_package_path, 'a') as zipf:
-            zipf.write(temp_file_path, os.path.join("app", "config", "config.yaml"))
-        logger.info(f"Added config file to {temp_package_path}")
+    config_file is any Django File (e.g. UploadedFile.file); its chunks are hashed and then streamed
+    straight into the archive. The base package is copied once and opened in append mode, so its
+    existing entries and central directory are reused rather than recompressed.
+    """
+    base_digest = build_cache.base_digest(deployment_package_path)
+    config_digest = chunks_hexdigest(config_file.chunks())
+    key = build_cache.key(base_digest, config_digest)
 
-        # Verify the contents of the ZIP file
-        with ZipFile(temp_package_path, 'r') as zipf:
+    def build(staging_path):
+        shutil.copyfile(deployment_package_path, staging_path)
+        with ZipFile(staging_path, 'a') as zipf:
             if 'lambda_function.py' not in zipf.namelist():
                 logger.error("lambda_function.py not found in the root of the zip file")
                 raise FileNotFoundError("lambda_function.py not found in the root of the zip file")
-            logger.info("Verified lambda_function.py is present in the root of the zip file")
+            write_config_entry(zipf, config_file)
+        logger.info(f"Assembled deployment package with config file at {staging_path}")
 
-        # Step 3: Obtain chatbot name
-        # DONE
+    return build_cache.get_or_build(key, build, workspace=workspace)
 
-        # Step 4: Upload the modified deployment package to Lambda
-        with open(temp_package_path, 'rb') as f:
-            lambda_zip = f.read()
+def assemble_shim_artifact(config_file, workspace=None):
+    """Returns a few-KB package holding only the handler shim and config, for functions on the runtime layer."""
+    shim_digest = build_cache.base_digest(bot_handler_path)
+    config_digest = chunks_hexdigest(config_file.chunks())
+    key = build_cache.key(f"shim:{shim_digest}", config_digest)
 
-        # Step 5: Create or update Lambda function
-        sanitize_name = lambda bot_name: ''.join(c for c in bot_name if c.isalnum() or c in '-_') # adhere to aws lambda naming restrictions
-        bot_name_clean = sanitize_name(chat_configuration_name)
-        function_name = f"user_{user_id}_agent_v0_{chat_configuration_name}"
+    def build(staging_path):
+        with ZipFile(staging_path, 'w') as zipf:
+            with open(bot_handler_path, 'rb') as src, zipf.open(zip_entry("bot_handler.py"), 'w') as dst:
+                shutil.copyfileobj(src, dst)
+            write_config_entry(zipf, config_file)
+        logger.info(f"Assembled layer-mode function package at {staging_path}")
 
-        lambda_client = boto3.client('lambda', region_name=aws_region)
-        api_client = boto3.client('apigateway', region_name=aws_region)
+    return build_cache.get_or_build(key, build, workspace=workspace)
 
-        environment_vars = {
-            'USER_CONFIG': os.path.join("app", "config", "config.yaml"),
-            'OPENAI_API_KEY': os.environ.get("OPENAI_API_KEY")
-        }
+def assemble_router_artifact(workspace=None):
+    """Returns the package for the pooled router function; the runtime itself comes from the shared layer."""
+    router_digest = build_cache.base_digest(router_handler_path)
+    key = build_cache.key(f"router:{router_digest}", '')
 
-        # Try to create or update Lambda function
+    def build(staging_path):
+        with ZipFile(staging_path, 'w') as zipf:
+            with open(router_handler_path, 'rb') as src, zipf.open(zip_entry("router_handler.py"), 'w') as dst:
+                shutil.copyfileobj(src, dst)
+        logger.info(f"Assembled router function package at {staging_path}")
+
+    return build_cache.get_or_build(key, build, workspace=workspace)
+
+@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
+def update_lambda_function(lambda_client, function_name, artifact, environment_vars, s3_client, handler=BUNDLED_HANDLER, layers=None):
+    """
+    Updates Lambda function code and configuration with retry mechanism.
+    Steps whose inputs already match the live function are skipped.
+    """
+    configuration = wait_for_function_ready(lambda_client, function_name)
+    if configuration.get('CodeSha256') == artifact.code_sha256:
+        logger.info(f"Code for {function_name} is unchanged. Skipping update_function_code.")
+    else:
+        lambda_client.update_function_code(FunctionName=function_name, **artifact_code(artifact, s3_client))
+        configuration = wait_for_function_ready(lambda_client, function_name)
+
+    layers = layers or []
+    current_vars = configuration.get('Environment', {}).get('Variables', {})
+    current_layers = [layer['Arn'] for layer in configuration.get('Layers', [])]
+    if (current_vars == environment_vars and configuration.get('Timeout') == LAMBDA_TIMEOUT
+            and configuration.get('Handler') == handler and current_layers == layers):
+        logger.info(f"Configuration for {function_name} is unchanged. Skipping update_function_configuration.")
+        return
+    lambda_client.update_function_configuration(
+        FunctionName=function_name,
+        Handler=handler,
+        Layers=layers,
+        Environment={'Variables': environment_vars},
+        Timeout=LAMBDA_TIMEOUT
+    )
+    wait_for_function_ready(lambda_client, function_name)
+
+@shared_task(bind=True)
+def deploy_user_app(self, user_id, config_file, chat_configuration_name, progress=None):
+    """
+    Deploys a chatbot for the given config file. Called in-process by deploy_chat_app, so
+    config_file may be the UploadedFile's FieldFile rather than a serializable value.
+    Each call gets its own workspace; its memory use (see track_peak_memory) and stage timings are
+    included in the result.
+    """
+    progress = progress or DeployProgress()
+    with track_peak_memory() as memory, task_workspace(f"deploy_{user_id}") as workspace:
+        result = _deploy_user_app(user_id, config_file, chat_configuration_name, workspace, progress)
+    result['peak_memory_bytes'] = memory['peak_traced_bytes']
+    result['rss_delta_bytes'] = memory['rss_delta_bytes']
+    result['stages'] = progress.stages
+    logger.info(f"Deployment for user_id {user_id}: peak heap {memory['peak_traced_bytes']} bytes, RSS change {memory['rss_delta_bytes']} bytes")
+    return result
+
+def create_or_update_function(lambda_client, s3_client, function_name, artifact, lambda_role, handler, layers, environment_vars, tags):
+    """Creates the function if it does not exist yet, otherwise updates it in place."""
+    try:
+        lambda_client.get_function(FunctionName=function_name)
+        function_exists = True
+    except lambda_client.exceptions.ResourceNotFoundException:
+        function_exists = False
+
+    if not function_exists:
         try:
-            response = lambda_client.create_function(
+            lambda_client.create_function(
                 FunctionName=function_name,
                 Runtime='python3.10',
                 Role=lambda_role,
-                Handler='lambda_function.handler',
-                Code={'ZipFile': lambda_zip},
+                Handler=handler,
+                Layers=layers,
+                Code=artifact_code(artifact, s3_client),
                 Environment={'Variables': environment_vars},
-                Timeout=30,  # Set timeout to 30 seconds
-                Tags={
-                    'Project': 'user-app-service',
-                    'Environment': 'production',
-                    'Feature': 'user-chat-deployment',
-                    'User': str(user_id),
-                    'Bot': chat_configuration_name
-                },
+                Timeout=LAMBDA_TIMEOUT,  # Set timeout to 30 seconds
+                Tags=tags,
             )
             logger.info(f"Created Lambda function {function_name}")
         except lambda_client.exceptions.ResourceConflictException:
-            # If function exists, update the code and the configuration
-            logger.info(f"Lambda function {function_name} already exists. Updating...")
-            update_lambda_function(lambda_client, function_name, lambda_zip, environment_vars)
-            logger.info(f"Updated Lambda function {function_name}")
-
-        # Update API Gateway configurations
-        api_id = os.environ.get('EXISTING_API_GATEWAY_ID')
-        if not api_id:
-            raise ValueError("EXISTING_API_GATEWAY_ID environment variable is not set.")
-
-        resources = api_client.get_resources(restApiId=api_id)
-        user_resource = next((item for item in resources['items'] if item.get('path') == '/user/{proxy+}'), None)
-        if not user_resource:
-            logger.error("The /user/{proxy+} resource does not exist in the API Gateway")
-            raise ValueError("Required API Gateway resource not found")
-
-        resource_id = user_resource['id']
-        try:
-            existing_method = api_client.get_method(
-                restApiId=api_id,
-                resourceId=resource_id,
-                httpMethod='ANY'
-            )
-            logger.info("Method 'ANY' already exists for this resource. Skipping method creation.")
-        except api_client.exceptions.NotFoundException:
-            api_client.put_method(
-                restApiId=api_id,
-                resourceId=resource_id,
-                httpMethod='ANY',
-                authorizationType='NONE'
-            )
-            logger.info("Created new 'ANY' method for the resource.")
+            # Created concurrently since the lookup above
+            function_exists = True
 
-        # Update integration and deploy
-        try:
-            api_client.put_integration(
-                restApiId=api_id,
-                resourceId=resource_id,
-                httpMethod='ANY',
-                type='AWS_PROXY',
-                integrationHttpMethod='POST',
-                uri=f"arn:aws:apigateway:{aws_region}:lambda:path/2015-03-31/functions/arn:aws:lambda:{aws_region}:{os.environ['AWS_ACCOUNT_ID']}:function:{function_name}/invocations"
-            )
-            logger.info("Updated integration for 'ANY' method.")
-        except Exception as e:
-            logger.error(f"Error updating integration: {str(e)}")
-            raise
+    if function_exists:
+        # If function exists, update the code and the configuration
+        logger.info(f"Lambda function {function_name} already exists. Updating...")
+        update_lambda_function(lambda_client, function_name, artifact, environment_vars, s3_client, handler, layers)
+        logger.info(f"Updated Lambda function {function_name}")
 
-        # Finalize API Gateway configuration
-        api_client.create_deployment(
-            restApiId=api_id,
-            stageName='prod'
-        )
+def integrate_api_gateway(api_client, lambda_client, aws_region, function_name, statement_id, progress=None):
+    """Points the /user/{proxy+} ANY integration at function_name and lets API Gateway invoke it. Returns the API ID."""
+    api_id = os.environ.get('EXISTING_API_GATEWAY_ID')
+    if not api_id:
+        raise ValueError("EXISTING_API_GATEWAY_ID environment variable is not set.")
+    progress = progress or DeployProgress()
+    with progress.stage('integrate'):
+        changed = put_user_integration(api_client, api_id, aws_region, function_name)
+
+    if changed:
+        # Finalize API Gateway configuration; concurrent deploys share one stage deployment
+        with progress.stage('stage_deploy'):
+            request_stage_deployment(api_client, api_id, 'prod')
 
-        # Set permissions for API Gateway to invoke Lambda
-        statement_id = f"apigateway-{user_id}-agent-{chat_configuration_name}"
+    # Set permissions for API Gateway to invoke Lambda
+    with progress.stage('permissions'):
         try:
             lambda_client.add_permission(
                 FunctionName=function_name,
@@ -186,19 +198,173 @@ def deploy_user_app(self, user_id, temp_file_path, chat_configuration_name):
             )
         except lambda_client.exceptions.ResourceConflictException:
             logger.info(f"Permission statement {statement_id} already exists. Skipping permission creation.")
+    return api_id
+
+def put_user_integration(api_client, api_id, aws_region, function_name):
+    """Makes the /user/{proxy+} ANY method integrate with function_name. Returns False if it already did."""
+    user_resource = resource_index.get(api_client, api_id, '/user/{proxy+}', refresh_on_miss=True)
+    if not user_resource:
+        logger.error("The /user/{proxy+} resource does not exist in the API Gateway")
+        raise ValueError("Required API Gateway resource not found")
+
+    resource_id = user_resource['id']
+    try:
+        existing_method = api_client.get_method(
+            restApiId=api_id,
+            resourceId=resource_id,
+            httpMethod='ANY'
+        )
+        logger.info("Method 'ANY' already exists for this resource. Skipping method creation.")
+    except api_client.exceptions.NotFoundException:
+        existing_method = {}
+        try:
+            api_client.put_method(
+                restApiId=api_id,
+                resourceId=resource_id,
+                httpMethod='ANY',
+                authorizationType='NONE'
+            )
+            logger.info("Created new 'ANY' method for the resource.")
+            # Indexed resources carry their methods; have every process re-list the API
+            resource_index.invalidate(api_id)
+        except api_client.exceptions.ConflictException:
+            # A concurrent deploy created it between our get_method and put_method
+            logger.info("Method 'ANY' was created by another deploy. Skipping method creation.")
+
+    # Update the integration, unless it already targets this function
+    uri = f"arn:aws:apigateway:{aws_region}:lambda:path/2015-03-31/functions/arn:aws:lambda:{aws_region}:{os.environ['AWS_ACCOUNT_ID']}:function:{function_name}/invocations"
+    if existing_method.get('methodIntegration', {}).get('uri') == uri:
+        logger.info("Integration for 'ANY' method already targets this function. Skipping stage deployment.")
+        return False
+    try:
+        api_client.put_integration(
+            restApiId=api_id,
+            resourceId=resource_id,
+            httpMethod='ANY',
+            type='AWS_PROXY',
+            integrationHttpMethod='POST',
+            uri=uri
+        )
+        logger.info("Updated integration for 'ANY' method.")
+    except Exception as e:
+        logger.error(f"Error updating integration: {str(e)}")
+        raise
+    return True
+
+def ensure_router(lambda_client, api_client, s3_client, aws_region, lambda_role, runtime_layer, workspace, progress=None):
+    """
+    Makes sure the pooled router function is current and wired to API Gateway.
+    The result is memoized per worker process, so steady-state deploys skip all Lambda and API Gateway calls.
+    """
+    progress = progress or DeployProgress()
+    with progress.stage('build_artifact'):
+        artifact = assemble_router_artifact(workspace)
+    layers = [runtime_layer.version_arn]
+    signature = (artifact.code_sha256, runtime_layer.version_arn)
+    if _router_state.get('signature') == signature:
+        return _router_state['api_id']
+
+    environment_vars = {
+        'ROUTER_CONFIG_BUCKET': config_bucket(),
+        'ROUTER_CONFIG_PREFIX': CONFIG_PREFIX,
+        'ROUTER_CONFIG_TTL': os.environ.get('ROUTER_CONFIG_TTL', '30'),
+        'ROUTER_CONFIG_CACHE_SIZE': os.environ.get('ROUTER_CONFIG_CACHE_SIZE', '256'),
+        'OPENAI_API_KEY': os.environ.get("OPENAI_API_KEY")
+    }
+    tags = {
+        'Project': 'user-app-service',
+        'Environment': 'production',
+        'Feature': 'user-chat-router',
+    }
+    with progress.stage('create_function'):
+        create_or_update_function(lambda_client, s3_client, ROUTER_FUNCTION_NAME, artifact, lambda_role, ROUTER_HANDLER, layers, environment_vars, tags)
+    with progress.stage('wait_ready'):
+        wait_for_function_ready(lambda_client, ROUTER_FUNCTION_NAME)
+    api_id = integrate_api_gateway(api_client, lambda_client, aws_region, ROUTER_FUNCTION_NAME, "apigateway-router", progress)
+    _router_state.update(signature=signature, api_id=api_id)
+    return api_id
+
+def _deploy_user_app(user_id, config_file, chat_configuration_name, workspace, progress):
+    try:
+        logger.info(f"Starting deployment for user_id: {user_id}, config file: {config_file.name}")
+        environment = os.environ.get('DJANGO_ENV', 'development')
+        logger.info(f"Environment: {environment}")
+
+        aws_region = os.environ.get('AWS_REGION')
+        lambda_role = os.environ.get('LAMBDA_EXECUTION_ROLE')
+        if not aws_region or not lambda_role:
+            raise ValueError("AWS_REGION or LAMBDA_EXECUTION_ROLE environment variable is not set.")
+
+        # 'bundled' ships the whole runtime with every function, 'layer' ships only config on top of a shared layer,
+        # 'router' publishes the config for one pooled function that serves every bot
+        runtime_mode = os.environ.get('LAMBDA_DEPLOY_MODE', 'bundled')
+        if runtime_mode not in ('bundled', 'layer', 'router'):
+            raise ValueError(f"Unsupported LAMBDA_DEPLOY_MODE: {runtime_mode}")
+
+        lambda_client = get_client('lambda', aws_region)
+        api_client = get_client('apigateway', aws_region)
+        s3_client = get_client('s3', aws_region)
+
+        if runtime_mode == 'router':
+            with progress.stage('build_artifact'):
+                runtime_layer = ensure_runtime_layer(lambda_client, s3_client, deployment_package_path, workspace)
+            api_id = ensure_router(lambda_client, api_client, s3_client, aws_region, lambda_role, runtime_layer, workspace, progress)
+            with progress.stage('publish_config'):
+                publish_config(s3_client, user_id, chat_configuration_name, config_file)
+            function_name = ROUTER_FUNCTION_NAME
+        else:
+            # Step 1-2: Build (or reuse) the deployment package with the config file added
+            with progress.stage('build_artifact'):
+                if runtime_mode == 'layer':
+                    runtime_layer = ensure_runtime_layer(lambda_client, s3_client, deployment_package_path, workspace)
+                    artifact = assemble_shim_artifact(config_file, workspace)
+                    handler = SHIM_HANDLER
+                    layers = [runtime_layer.version_arn]
+                else:
+                    runtime_layer = None
+                    artifact = assemble_artifact(config_file, workspace)
+                    handler = BUNDLED_HANDLER
+                    layers = []
+            logger.info(f"Deployment package ready at {artifact.path}. Build cache stats: {build_cache.stats()}")
+
+            # Step 3: Obtain chatbot name
+            # DONE
+
+            # Step 5: Create or update Lambda function
+            sanitize_name = lambda bot_name: ''.join(c for c in bot_name if c.isalnum() or c in '-_') # adhere to aws lambda naming restrictions
+            bot_name_clean = sanitize_name(chat_configuration_name)
+            function_name = f"user_{user_id}_agent_v0_{chat_configuration_name}"
+
+            environment_vars = {
+                'USER_CONFIG': CONFIG_ARCNAME,
+                'OPENAI_API_KEY': os.environ.get("OPENAI_API_KEY")
+            }
+            tags = {
+                'Project': 'user-app-service',
+                'Environment': 'production',
+                'Feature': 'user-chat-deployment',
+                'User': str(user_id),
+                'Bot': chat_configuration_name
+            }
+            with progress.stage('create_function'):
+                create_or_update_function(lambda_client, s3_client, function_name, artifact, lambda_role, handler, layers, environment_vars, tags)
+            with progress.stage('wait_ready'):
+                wait_for_function_ready(lambda_client, function_name)
+
+            # Update API Gateway configurations
+            statement_id = f"apigateway-{user_id}-agent-{chat_configuration_name}"
+            api_id = integrate_api_gateway(api_client, lambda_client, aws_region, function_name, statement_id, progress)
 
         unique_endpoint = f"https://{api_id}.execute-api.{aws_region}.amazonaws.com/prod/user/{user_id}/agent/v0/{chat_configuration_name}/chat"
         logger.info(f"Deployment completed. Endpoint: {unique_endpoint}")
 
-        # Clean up
-        os.remove(temp_package_path)
-        shutil.rmtree(user_dir)
-
         return {
             'status': 'completed',
             'resource_name': function_name,
             'endpoint': unique_endpoint, 
-            'temp_file_path': temp_file_path,
+            'config_file_path': config_file.name,
+            'runtime_mode': runtime_mode,
+            'runtime_layer_id': runtime_layer.id if runtime_layer else None,
             'chatbot_name': chat_configuration_name
         }
     except Exception as e:
@@ -206,5 +372,5 @@ def deploy_user_app(self, user_id, temp_file_path, chat_configuration_name):
         return {
             'status': 'failed',
             'error': str(e),
-            'temp_file_path': temp_file_path
+            'config_file_path': config_file.name
         }
@@ -0,0 +1,281 @@
+import base64
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict, deque
+from botocore import xform_name
+from botocore.awsrequest import AWSResponse
+
+# Seconds each operation takes to answer, before jitter; anything not listed uses 'default'
+DEFAULT_LATENCIES = {
+    'default': 0.03,
+    'create_function': 0.25,
+    'update_function_code': 0.2,
+    'update_function_configuration': 0.1,
+    'delete_function': 0.1,
+    'get_resources': 0.1,
+    'put_integration': 0.08,
+    'create_deployment': 0.3,
+}
+# Requests per second each service accepts before answering 429, like the account's control-plane quotas
+DEFAULT_RATE_LIMITS = {'lambda': 15, 'api-gateway': 10}
+
+
+class FakeAWSError(Exception):
+    def __init__(self, status, code, message):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.message = message
+
+
+class _RawBody:
+    def __init__(self, body):
+        self.body = body
+
+    def stream(self, **kwargs):
+        yield self.body
+
+
+class FakeAWS:
+    """
+    In-process stand-in for the Lambda and API Gateway operations used by deploy_lambda and teardown_lambda.
+
+    It is installed on the client registry as a before-send handler, so calls are still validated,
+    serialized, retried and parsed by botocore, and still pass the control-plane limiter and the
+    metrics hooks; only the HTTP round trip is replaced. Each operation sleeps for its configured
+    latency. Functions report State Pending for pending_seconds after creation and LastUpdateStatus
+    InProgress for update_seconds after every code or configuration change; changing a busy function
+    fails with ResourceConflictException. Requests above a service's rate limit get a 429
+    TooManyRequestsException, which botocore retries.
+    """
+
+    def __init__(self, latencies=None, latency_scale=1.0, jitter=0.2, pending_seconds=0.5, update_seconds=1.0,
+                 rate_limits=None, api_id='fakeapi000', region='us-east-1', account_id='000000000000'):
+        self.latencies = {**DEFAULT_LATENCIES, **(latencies or {})}
+        self.latency_scale = latency_scale
+        self.jitter = jitter
+        self.pending_seconds = pending_seconds
+        self.update_seconds = update_seconds
+        self.rate_limits = DEFAULT_RATE_LIMITS if rate_limits is None else rate_limits
+        self.api_id = api_id
+        self.region = region
+        self.account_id = account_id
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._recent = defaultdict(deque)  # service -> request times in the last second
+        self.functions = {}
+        self.permissions = defaultdict(set)
+        self.resources = {}
+        self.methods = {}
+        self.stage_deployments = 0
+        self.calls = Counter()
+        self.throttled = Counter()
+        self.conflicts = Counter()
+
+        root = self._add_resource('/', None)
+        user = self._add_resource('/user', root)
+        self._add_resource('/user/{proxy+}', user)
+
+    def install(self, registry):
+        registry.register('before-parameter-build', self._remember_call)
+        registry.register('before-send', self._before_send)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'calls': dict(self.calls),
+                'throttled': dict(self.throttled),
+                'conflicts': dict(self.conflicts),
+                'functions': len(self.functions),
+                'stage_deployments': self.stage_deployments,
+            }
+
+    # botocore hooks
+
+    def _remember_call(self, params, model, **kwargs):
+        self._local.call = (model, dict(params))
+
+    def _before_send(self, request, event_name, **kwargs):
+        model, params = self._local.call
+        service = event_name.split('.')[1]
+        operation = xform_name(model.name)
+        handler = getattr(self, f"_{operation}", None)
+        if handler is None:
+            raise NotImplementedError(f"FakeAWS does not implement {service}.{operation}")
+
+        time.sleep(self._latency(operation))
+        with self._lock:
+            self.calls[operation] += 1
+            try:
+                self._admit(service, operation)
+                status, body = model.http.get('responseCode', 200), handler(**params)
+            except FakeAWSError as e:
+                status, body = e.status, {'message': e.message, 'Type': 'User'}
+                headers = {'x-amzn-ErrorType': e.code, 'Content-Type': 'application/json'}
+                return self._response(request, status, headers, body)
+        return self._response(request, status, {'Content-Type': 'application/json'}, body)
+
+    def _response(self, request, status, headers, body):
+        raw = b'' if body is None else json.dumps(body).encode()
+        return AWSResponse(request.url, status, headers, _RawBody(raw))
+
+    def _latency(self, operation):
+        latency = self.latencies.get(operation, self.latencies['default']) * self.latency_scale
+        return max(0, latency * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def _admit(self, service, operation):
+        limit = self.rate_limits.get(service)
+        if not limit:
+            return
+        now = time.monotonic()
+        recent = self._recent[service]
+        while recent and recent[0] <= now - 1:
+            recent.popleft()
+        if len(recent) >= limit:
+            self.throttled[operation] += 1
+            raise FakeAWSError(429, 'TooManyRequestsException', 'Rate exceeded')
+        recent.append(now)
+
+    # Lambda
+
+    def _function(self, name):
+        function = self.functions.get(name)
+        if function is None:
+            raise FakeAWSError(404, 'ResourceNotFoundException', f"Function not found: {name}")
+        return function
+
+    def _configuration(self, function):
+        now = time.monotonic()
+        configuration = dict(function['configuration'])
+        configuration['State'] = 'Pending' if now < function['pending_until'] else 'Active'
+        configuration['LastUpdateStatus'] = 'InProgress' if now < function['busy_until'] else 'Successful'
+        return configuration
+
+    def _change(self, function, operation):
+        if time.monotonic() < max(function['pending_until'], function['busy_until']):
+            self.conflicts[operation] += 1
+            raise FakeAWSError(409, 'ResourceConflictException', 'The operation cannot be performed at this time. An update is in progress for resource.')
+        function['busy_until'] = time.monotonic() + self.update_seconds
+        function['configuration']['RevisionId'] = str(uuid.uuid4())
+
+    def _code_sha256(self, Code):
+        data = Code.get('ZipFile') or f"{Code.get('S3Bucket')}/{Code.get('S3Key')}".encode()
+        return base64.b64encode(hashlib.sha256(data).digest()).decode(), len(data)
+
+    def _get_function(self, FunctionName, **kwargs):
+        return {'Configuration': self._configuration(self._function(FunctionName))}
+
+    def _create_function(self, FunctionName, Code, **kwargs):
+        if FunctionName in self.functions:
+            raise FakeAWSError(409, 'ResourceConflictException', f"Function already exist: {FunctionName}")
+        code_sha256, code_size = self._code_sha256(Code)
+        now = time.monotonic()
+        self.functions[FunctionName] = function = {
+            'pending_until': now + self.pending_seconds,
+            'busy_until': now,
+            'configuration': {
+                'FunctionName': FunctionName,
+                'FunctionArn': f"arn:aws:lambda:{self.region}:{self.account_id}:function:{FunctionName}",
+                'Runtime': kwargs.get('Runtime'),
+                'Role': kwargs.get('Role'),
+                'Handler': kwargs.get('Handler'),
+                'Timeout': kwargs.get('Timeout', 3),
+                'Environment': kwargs.get('Environment', {}),
+                'Layers': [{'Arn': arn} for arn in kwargs.get('Layers', [])],
+                'CodeSha256': code_sha256,
+                'CodeSize': code_size,
+                'RevisionId': str(uuid.uuid4()),
+            },
+        }
+        return self._configuration(function)
+
+    def _update_function_code(self, FunctionName, **kwargs):
+        function = self._function(FunctionName)
+        self._change(function, 'update_function_code')
+        code_sha256, code_size = self._code_sha256(kwargs)
+        function['configuration'].update(CodeSha256=code_sha256, CodeSize=code_size)
+        return self._configuration(function)
+
+    def _update_function_configuration(self, FunctionName, **kwargs):
+        function = self._function(FunctionName)
+        self._change(function, 'update_function_configuration')
+        configuration = function['configuration']
+        for key in ('Handler', 'Timeout', 'Environment', 'Role'):
+            if key in kwargs:
+                configuration[key] = kwargs[key]
+        if 'Layers' in kwargs:
+            configuration['Layers'] = [{'Arn': arn} for arn in kwargs['Layers']]
+        return self._configuration(function)
+
+    def _delete_function(self, FunctionName, **kwargs):
+        self._function(FunctionName)
+        del self.functions[FunctionName]
+        self.permissions.pop(FunctionName, None)
+        return None
+
+    def _add_permission(self, FunctionName, StatementId, **kwargs):
+        self._function(FunctionName)
+        if StatementId in self.permissions[FunctionName]:
+            raise FakeAWSError(409, 'ResourceConflictException', f"The statement id ({StatementId}) provided already exists.")
+        self.permissions[FunctionName].add(StatementId)
+        return {'Statement': json.dumps({'Sid': StatementId})}
+
+    def _remove_permission(self, FunctionName, StatementId, **kwargs):
+        if StatementId not in self.permissions.get(FunctionName, ()):
+            raise FakeAWSError(404, 'ResourceNotFoundException', 'No policy is associated with the given resource.')
+        self.permissions[FunctionName].discard(StatementId)
+        return None
+
+    # API Gateway
+
+    def _add_resource(self, path, parent_id):
+        resource_id = uuid.uuid4().hex[:10]
+        self.resources[path] = {'id': resource_id, 'path': path, **({'parentId': parent_id} if parent_id else {})}
+        return resource_id
+
+    def _check_api(self, restApiId):
+        if restApiId != self.api_id:
+            raise FakeAWSError(404, 'NotFoundException', 'Invalid API identifier specified')
+
+    def _method(self, restApiId, resourceId, httpMethod):
+        self._check_api(restApiId)
+        method = self.methods.get((resourceId, httpMethod))
+        if method is None:
+            raise FakeAWSError(404, 'NotFoundException', 'Invalid Method identifier specified')
+        return method
+
+    def _get_resources(self, restApiId, **kwargs):
+        self._check_api(restApiId)
+        # The wire name of Resources.items is 'item'
+        return {'item': list(self.resources.values())}
+
+    def _get_method(self, restApiId, resourceId, httpMethod, **kwargs):
+        return self._method(restApiId, resourceId, httpMethod)
+
+    def _put_method(self, restApiId, resourceId, httpMethod, authorizationType, **kwargs):
+        self._check_api(restApiId)
+        if (resourceId, httpMethod) in self.methods:
+            raise FakeAWSError(409, 'ConflictException', 'Method already exists for this resource')
+        method = {'httpMethod': httpMethod, 'authorizationType': authorizationType}
+        self.methods[(resourceId, httpMethod)] = method
+        return method
+
+    def _put_integration(self, restApiId, resourceId, httpMethod, type, uri=None, **kwargs):
+        method = self._method(restApiId, resourceId, httpMethod)
+        method['methodIntegration'] = {'type': type, 'uri': uri, 'httpMethod': kwargs.get('integrationHttpMethod')}
+        return method['methodIntegration']
+
+    def _delete_method(self, restApiId, resourceId, httpMethod, **kwargs):
+        self._method(restApiId, resourceId, httpMethod)
+        del self.methods[(resourceId, httpMethod)]
+        return None
+
+    def _create_deployment(self, restApiId, stageName=None, description=None, **kwargs):
+        self._check_api(restApiId)
+        self.stage_deployments += 1
+        return {'id': uuid.uuid4().hex[:6], 'description': description}
@@ -0,0 +1,79 @@
+import logging
+import os
+import shutil
+from zipfile import ZipFile
+from backend.accounts.models import Deployment, RuntimeLayer
+from .build_cache import build_cache, artifact_code, zip_entry, CHUNK_SIZE
+from .waiters import wait_for_function_ready
+
+logger = logging.getLogger(__name__)
+
+LAYER_NAME = os.environ.get('LAMBDA_RUNTIME_LAYER_NAME', 'chatbot-runtime')
+LAYER_RUNTIMES = ['python3.10']
+
+def assemble_layer_artifact(package_path, workspace=None):
+    """Re-roots the deployment package under python/ so Lambda adds it to sys.path from /opt."""
+    package_digest = build_cache.base_digest(package_path)
+    key = build_cache.key(package_digest, 'runtime-layer')
+
+    def build(staging_path):
+        with ZipFile(package_path, 'r') as src, ZipFile(staging_path, 'w') as dst:
+            for info in src.infolist():
+                if info.is_dir():
+                    continue
+                entry = zip_entry(f"python/{info.filename}")
+                entry.external_attr = info.external_attr or entry.external_attr
+                with src.open(info) as reader, dst.open(entry, 'w') as writer:
+                    shutil.copyfileobj(reader, writer, CHUNK_SIZE)
+        logger.info(f"Assembled runtime layer package at {staging_path}")
+
+    return build_cache.get_or_build(key, build, workspace=workspace)
+
+def ensure_runtime_layer(lambda_client, s3_client, package_path, workspace=None):
+    """Returns the RuntimeLayer for the current package, publishing a new layer version only when the package changed."""
+    package_digest = build_cache.base_digest(package_path)
+    layer = RuntimeLayer.objects.filter(layer_name=LAYER_NAME, package_digest=package_digest).order_by('-version').first()
+    if layer:
+        logger.info(f"Runtime layer {layer} is current for package {package_digest[:12]}")
+        return layer
+
+    artifact = assemble_layer_artifact(package_path, workspace)
+    response = lambda_client.publish_layer_version(
+        LayerName=LAYER_NAME,
+        Description=f"Chatbot runtime {package_digest[:12]}",
+        Content=artifact_code(artifact, s3_client),
+        CompatibleRuntimes=LAYER_RUNTIMES,
+    )
+    layer, _ = RuntimeLayer.objects.get_or_create(
+        version_arn=response['LayerVersionArn'],
+        defaults={
+            'layer_name': LAYER_NAME,
+            'version': response['Version'],
+            'package_digest': package_digest,
+        },
+    )
+    logger.info(f"Published runtime layer {layer}")
+    return layer
+
+def roll_forward(lambda_client, layer, deployments=None):
+    """
+    Points every active layer-mode deployment that is not on layer at it.
+    Only the function configuration changes, so no code is uploaded. Returns the number of functions updated.
+    """
+    if deployments is None:
+        deployments = Deployment.objects.all()
+    stale = deployments.filter(runtime_mode='layer', status='active').exclude(runtime_layer=layer)
+    rolled = 0
+    for deployment in stale:
+        function_name = deployment.resource_name
+        try:
+            wait_for_function_ready(lambda_client, function_name)
+            lambda_client.update_function_configuration(FunctionName=function_name, Layers=[layer.version_arn])
+        except lambda_client.exceptions.ResourceNotFoundException:
+            logger.warning(f"Lambda function {function_name} not found. Skipping roll forward.")
+            continue
+        deployment.runtime_layer = layer
+        deployment.save(update_fields=['runtime_layer'])
+        rolled += 1
+        logger.info(f"Rolled {function_name} forward to runtime layer {layer}")
+    return rolled
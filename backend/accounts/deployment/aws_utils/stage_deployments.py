@@ -0,0 +1,62 @@
+import logging
+import os
+import time
+import uuid
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+COALESCE_WINDOW = float(os.environ.get('STAGE_DEPLOY_COALESCE_WINDOW', 2))
+DEPLOY_DEADLINE = float(os.environ.get('STAGE_DEPLOY_DEADLINE', 120))
+LEADER_LEASE = 60
+POLL_INTERVAL = 0.25
+
+
+def _keys(api_id, stage_name):
+    prefix = f"stage-deploy:{api_id}:{stage_name}"
+    return f"{prefix}:pending", f"{prefix}:deployed", f"{prefix}:leader"
+
+
+def request_stage_deployment(api_client, api_id, stage_name='prod', window=None, deadline=None):
+    """
+    Registers an applied route/integration change and returns once a stage deployment that includes it is live.
+
+    Every change gets a sequence number. One caller at a time becomes the leader, waits out the
+    coalescing window so concurrent changes can join, then issues a single create_deployment for
+    everything registered so far and publishes the highest sequence number it covered. The other
+    callers return as soon as the published number reaches theirs.
+    """
+    window = COALESCE_WINDOW if window is None else window
+    deadline = DEPLOY_DEADLINE if deadline is None else deadline
+    pending_key, deployed_key, leader_key = _keys(api_id, stage_name)
+
+    cache.add(pending_key, 0, timeout=None)
+    sequence = cache.incr(pending_key)
+    started = time.monotonic()
+    token = uuid.uuid4().hex
+
+    while True:
+        if (cache.get(deployed_key) or 0) >= sequence:
+            logger.info(f"Stage {stage_name} change {sequence} is live after {time.monotonic() - started:.2f}s")
+            return
+
+        if cache.add(leader_key, token, timeout=LEADER_LEASE):
+            try:
+                time.sleep(window)
+                covered = cache.get(pending_key)
+                batch_size = covered - (cache.get(deployed_key) or 0)
+                api_client.create_deployment(
+                    restApiId=api_id,
+                    stageName=stage_name,
+                    description=f"Coalesced deployment of {batch_size} change(s)"
+                )
+                cache.set(deployed_key, covered, timeout=None)
+                logger.info(f"Deployed stage {stage_name} covering {batch_size} change(s) up to {covered}")
+            finally:
+                if cache.get(leader_key) == token:
+                    cache.delete(leader_key)
+            continue
+
+        if time.monotonic() - started > deadline:
+            raise TimeoutError(f"Stage {stage_name} change {sequence} was not deployed within {deadline:g}s.")
+        time.sleep(POLL_INTERVAL)
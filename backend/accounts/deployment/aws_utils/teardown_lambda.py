@@ -1,116 +1,177 @@
-import boto3
 import os
 import logging
-import time
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import ClientError
 from django.db import transaction
 from tenacity import retry, stop_after_attempt, wait_exponential
-from backend.accounts.models import Deployment
+from backend.accounts.models import Deployment, UploadedFile
+from backend.accounts.metrics import time_stage
+from backend.accounts.versions import bump_user_version
+from .config_store import unpublish_config
+from .clients import get_client
+from .waiters import wait_for_function_ready
+from .api_resources import resource_index
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def wait_for_deletion_to_complete(lambda_client, function_name):
-    """Polls the Lambda function's status and waits for any ongoing deletions to complete."""
-    max_attempts = 12  # Total 120 seconds wait time
-    attempts = 0
-    while attempts < max_attempts:
+# Deployments torn down in parallel by one bulk teardown; the shared clients back off on throttling
+TEARDOWN_MAX_WORKERS = int(os.environ.get('TEARDOWN_MAX_WORKERS', 4))
+
+def mark_inactive(deployment):
+    """Records a successful teardown and returns the task result."""
+    try:
+        with transaction.atomic():
+            deployment.status = 'inactive'
+            deployment.save(update_fields=['status'])
+            # Lets the file be deployed again, as mark_all_inactive does for bulk teardowns
+            if deployment.config_file_id:
+                UploadedFile.objects.filter(id=deployment.config_file_id).update(has_deployment=False)
+    except Exception:
+        logger.error("Error updating deployment status and config file.")
+        return {
+            'status': 'failed',
+            'error': 'Error updating deployment status and config file.'
+        }
+
+    return {
+        'status': 'completed',
+        'deployment_status': deployment.status,
+        'endpoint': deployment.endpoint,
+        'message': 'Teardown successful'
+        }
+
+def release_resources(user_id, deployment, aws_region):
+    """Deletes the AWS resources behind a deployment. Raises on failure; does not touch the database."""
+    bot_name = deployment.chatbot_name
+    function_name = deployment.resource_name
+    logger.info(f"Attempting to tear down resource name: {function_name}")
+
+    if deployment.runtime_mode == 'router':
+        # The pooled router keeps serving other bots; withdrawing the config is the whole teardown
+        s3_client = get_client('s3', aws_region)
+        unpublish_config(s3_client, user_id, bot_name)
+        return
+
+    lambda_client = get_client('lambda', aws_region)
+    api_client = get_client('apigateway', aws_region)
+
+    # Wait for any ongoing updates to complete
+    wait_for_function_ready(lambda_client, function_name, missing_ok=True)
+
+    # Step 1: Delete the Lambda function
+    try:
+        lambda_client.delete_function(FunctionName=function_name)
+        logger.info(f"Deleted Lambda function {function_name}")
+    except lambda_client.exceptions.ResourceNotFoundException:
+        logger.info(f"Lambda function {function_name} does not exist. Skipping deletion.")
+        raise ValueError("Lambda function not found for function name: {function_name}.")
+
+    # Step 2: Remove API Gateway configurations
+    api_id = os.environ.get('EXISTING_API_GATEWAY_ID')
+    if not api_id:
+        raise ValueError("EXISTING_API_GATEWAY_ID environment variable is not set.")
+
+    user_resource = resource_index.get(api_client, api_id, f"/user/{user_id}/{bot_name}/chat", refresh_on_miss=True)
+    if user_resource:
+        resource_id = user_resource['id']
         try:
-            response = lambda_client.get_function(FunctionName=function_name)
-            update_status = response['Configuration'].get('LastUpdateStatus', 'Successful')
-            if update_status != 'InProgress':
-                logger.info(f"Deletion complete. LastUpdateStatus: {update_status}")
-                return
-        except lambda_client.exceptions.ResourceNotFoundException:
-            logger.info(f"Function {function_name} no longer exists.")
-            return
-        logger.info(f"Deletion in progress, waiting... (Attempt {attempts+1}/{max_attempts})")
-        time.sleep(10)  # Polling interval
-        attempts += 1
-    raise TimeoutError("Max polling attempts reached. Lambda function deletion did not complete in time.")
+            api_client.delete_method(
+                restApiId=api_id,
+                resourceId=resource_id,
+                httpMethod='ANY'
+            )
+            logger.info(f"Deleted 'ANY' method for resource {resource_id}")
+            resource_index.invalidate(api_id)
+        except api_client.exceptions.NotFoundException:
+            logger.info(f"Method 'ANY' not found for resource {resource_id}. Skipping deletion.")
+    else:
+        logger.info(f"Resource for user {user_id} and bot {bot_name} not found. Skipping API Gateway teardown.")
+
+    # Step 3: Remove permission for API Gateway to invoke Lambda
+    statement_id = f"apigateway-{user_id}-{bot_name}"
+    try:
+        lambda_client.remove_permission(
+            FunctionName=function_name,
+            StatementId=statement_id
+        )
+        logger.info(f"Removed permission statement {statement_id}")
+    except lambda_client.exceptions.ResourceNotFoundException:
+        logger.info(f"Permission statement {statement_id} does not exist. Skipping permission removal.")
 
 @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
 def teardown_user_app(user_id, deployment):
     try:
-        bot_name = deployment.chatbot_name
-        logger.info(f"Starting teardown for user_id: {user_id}, bot_name: {bot_name}")
+        logger.info(f"Starting teardown for user_id: {user_id}, bot_name: {deployment.chatbot_name}")
 
         aws_region = os.environ.get('AWS_REGION')
         if not aws_region:
             raise ValueError("AWS_REGION environment variable is not set.")
 
-        function_name = deployment.resource_name
-        logger.info(f"Attempting to tear down resource name: {function_name}")
-        lambda_client = boto3.client('lambda', region_name=aws_region)
-        api_client = boto3.client('apigateway', region_name=aws_region)
-
-        # Wait for any ongoing updates to complete
-        wait_for_deletion_to_complete(lambda_client, function_name)
-
-        # Step 1: Delete the Lambda function
-        try:
-            lambda_client.delete_function(FunctionName=function_name)
-            logger.info(f"Deleted Lambda function {function_name}")
-        except lambda_client.exceptions.ResourceNotFoundException:
-            logger.info(f"Lambda function {function_name} does not exist. Skipping deletion.")
-            raise ValueError("Lambda function not found for function name: {function_name}.")
-
-        # Step 2: Remove API Gateway configurations
-        api_id = os.environ.get('EXISTING_API_GATEWAY_ID')
-        if not api_id:
-            raise ValueError("EXISTING_API_GATEWAY_ID environment variable is not set.")
-
-        resources = api_client.get_resources(restApiId=api_id)
-        user_resource = next((item for item in resources['items'] if item.get('path') == f"/user/{user_id}/{bot_name}/chat"), None)
-        if user_resource:
-            resource_id = user_resource['id']
-            try:
-                api_client.delete_method(
-                    restApiId=api_id,
-                    resourceId=resource_id,
-                    httpMethod='ANY'
-                )
-                logger.info(f"Deleted 'ANY' method for resource {resource_id}")
-            except api_client.exceptions.NotFoundException:
-                logger.info(f"Method 'ANY' not found for resource {resource_id}. Skipping deletion.")
-        else:
-            logger.info(f"Resource for user {user_id} and bot {bot_name} not found. Skipping API Gateway teardown.")
-
-        # Step 3: Remove permission for API Gateway to invoke Lambda
-        statement_id = f"apigateway-{user_id}-{bot_name}"
-        try:
-            lambda_client.remove_permission(
-                FunctionName=function_name,
-                StatementId=statement_id
-            )
-            logger.info(f"Removed permission statement {statement_id}")
-        except lambda_client.exceptions.ResourceNotFoundException:
-            logger.info(f"Permission statement {statement_id} does not exist. Skipping permission removal.")
-
+        with time_stage('teardown', 'release_resources'):
+            release_resources(user_id, deployment, aws_region)
         logger.info("Teardown completed successfully.")
 
         # Step 4: Update database
-        try:
-            with transaction.atomic():
-                deployment.status = 'inactive'
-                deployment.save(update_fields=['status'])
-        except Exception:
-            logger.error("Error updating deployment status and config file.")
-            return {
-                'status': 'failed',
-                'error': 'Error updating deployment status and config file.'
-            }
-        
-        return {
-            'status': 'completed',
-            'deployment_status': deployment.status,
-            'endpoint': deployment.endpoint,
-            'message': 'Teardown successful'
-            }
+        with time_stage('teardown', 'mark_inactive'):
+            return mark_inactive(deployment)
     except Exception as e:
         logger.error(f"Error during teardown: {str(e)}")
         return {
             'status': 'failed',
             'error': str(e)
         }
+
+def mark_all_inactive(deployments):
+    """Marks deployments inactive and frees their config files, one UPDATE per table."""
+    deployment_ids = [deployment.id for deployment in deployments]
+    with transaction.atomic():
+        Deployment.objects.filter(id__in=deployment_ids).update(status='inactive')
+        UploadedFile.objects.filter(deployments__id__in=deployment_ids).update(has_deployment=False)
+        # .update() sends no signals
+        for user_id in {deployment.user_id for deployment in deployments}:
+            bump_user_version(user_id)
+
+def teardown_user_apps(deployments, max_workers=None):
+    """
+    Tears down many deployments at once and returns {deployment_id: result}.
+
+    AWS deletes for different deployments run concurrently on a bounded thread pool; the
+    database is then updated for every deployment that was released in a single transaction.
+    """
+    aws_region = os.environ.get('AWS_REGION')
+    if not aws_region:
+        raise ValueError("AWS_REGION environment variable is not set.")
+
+    def release(deployment):
+        try:
+            with time_stage('teardown', 'release_resources'):
+                release_resources(deployment.user_id, deployment, aws_region)
+            return deployment.id, None
+        except Exception as e:
+            logger.error(f"Error tearing down deployment {deployment.id}: {str(e)}")
+            return deployment.id, str(e)
+
+    with ThreadPoolExecutor(max_workers=max_workers or TEARDOWN_MAX_WORKERS) as executor:
+        errors = dict(executor.map(release, deployments))
+
+    released = [deployment for deployment in deployments if errors[deployment.id] is None]
+    try:
+        with time_stage('teardown', 'mark_inactive'):
+            mark_all_inactive(released)
+    except Exception as e:
+        logger.error(f"Error updating deployment statuses: {str(e)}")
+        errors.update({deployment.id: 'Error updating deployment status and config file.' for deployment in released})
+        released = []
+
+    results = {deployment_id: {'status': 'failed', 'error': error} for deployment_id, error in errors.items() if error}
+    for deployment in released:
+        results[deployment.id] = {
+            'status': 'completed',
+            'deployment_status': 'inactive',
+            'endpoint': deployment.endpoint,
+            'message': 'Teardown successful'
+        }
+    logger.info(f"Bulk teardown released {len(released)} of {len(deployments)} deployment(s)")
+    return results
@@ -0,0 +1,65 @@
+import logging
+import os
+import random
+import time
+from backend.accounts.metrics import WAITER_STATE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEADLINE = float(os.environ.get('LAMBDA_WAIT_DEADLINE', 120))
+INITIAL_DELAY = float(os.environ.get('LAMBDA_WAIT_INITIAL_DELAY', 0.25))
+MAX_DELAY = float(os.environ.get('LAMBDA_WAIT_MAX_DELAY', 5))
+
+# Lambda states that mean another change is still being applied
+BUSY_STATES = ('Pending', 'InProgress')
+
+
+def wait_for_state(poll, is_done, description, deadline=None, initial_delay=None, max_delay=None):
+    """
+    Calls poll() until is_done(state) holds, sleeping with jittered exponential backoff in between.
+
+    poll returns a (state, value) pair; the value of the final poll is returned. Time spent in each
+    observed state is recorded in WAITER_STATE_SECONDS. Raises TimeoutError once deadline seconds have passed.
+    """
+    deadline = DEFAULT_DEADLINE if deadline is None else deadline
+    delay = INITIAL_DELAY if initial_delay is None else initial_delay
+    max_delay = MAX_DELAY if max_delay is None else max_delay
+
+    started = time.monotonic()
+    attempts = 0
+    while True:
+        polled_at = time.monotonic()
+        state, value = poll()
+        attempts += 1
+        if is_done(state):
+            logger.info(f"{description} reached state {state} after {attempts} poll(s), {polled_at - started:.2f}s")
+            return value
+
+        remaining = started + deadline - time.monotonic()
+        if remaining <= 0:
+            WAITER_STATE_SECONDS.labels(state).observe(time.monotonic() - polled_at)
+            raise TimeoutError(f"{description} still {state} after {deadline:g}s.")
+        sleep_for = min(remaining, random.uniform(delay / 2, delay))
+        logger.info(f"{description} is {state}, polling again in {sleep_for:.2f}s")
+        time.sleep(sleep_for)
+        WAITER_STATE_SECONDS.labels(state).observe(time.monotonic() - polled_at)
+        delay = min(max_delay, delay * 2)
+
+
+def wait_for_function_ready(lambda_client, function_name, deadline=None, missing_ok=False):
+    """
+    Waits until the Lambda function has no create or update in progress and returns its configuration.
+    With missing_ok, a function that does not exist counts as ready and None is returned.
+    """
+    def poll():
+        try:
+            configuration = lambda_client.get_function(FunctionName=function_name)['Configuration']
+        except lambda_client.exceptions.ResourceNotFoundException:
+            if not missing_ok:
+                raise
+            return 'Missing', None
+        if configuration.get('State') == 'Pending':
+            return 'Pending', configuration
+        return configuration.get('LastUpdateStatus', 'Successful'), configuration
+
+    return wait_for_state(poll, lambda state: state not in BUSY_STATES, f"Lambda function {function_name}", deadline)
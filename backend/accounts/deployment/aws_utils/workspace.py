@@ -0,0 +1,80 @@
+import contextlib
+import logging
+import os
+import resource
+import shutil
+import tempfile
+import threading
+import tracemalloc
+
+from .build_cache import DEFAULT_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+# Kept on the same filesystem as the build cache so finished artifacts are published with a rename
+WORKSPACE_ROOT = os.environ.get('DEPLOY_WORKSPACE_ROOT', os.path.join(DEFAULT_CACHE_DIR, 'workspaces'))
+# tracemalloc slows every allocation in the process while it is on, so heap tracing is opt-in
+TRACE_MEMORY = os.environ.get('DEPLOY_TRACE_MEMORY', '').lower() in ('1', 'true', 'yes')
+
+# Blocks tracing at once; tracemalloc is process-wide, so it stays on until the last of them exits
+_tracing_lock = threading.Lock()
+_tracing_blocks = 0
+
+
+@contextlib.contextmanager
+def task_workspace(prefix):
+    """Yields a scratch directory private to one task; removed when the task finishes."""
+    os.makedirs(WORKSPACE_ROOT, exist_ok=True)
+    path = tempfile.mkdtemp(prefix=f"{prefix}_", dir=WORKSPACE_ROOT)
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def current_rss_bytes():
+    """Resident set size of this process right now, or None where /proc is unavailable."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except (OSError, ValueError, IndexError):
+        return None
+
+def _start_tracing():
+    global _tracing_blocks
+    with _tracing_lock:
+        _tracing_blocks += 1
+        if _tracing_blocks == 1:
+            tracemalloc.start()
+
+def _stop_tracing():
+    global _tracing_blocks
+    with _tracing_lock:
+        _, peak = tracemalloc.get_traced_memory()
+        _tracing_blocks -= 1
+        if _tracing_blocks == 0:
+            tracemalloc.stop()
+    return peak
+
+
+@contextlib.contextmanager
+def track_peak_memory():
+    """
+    Measures memory use around the enclosed block. The yielded dict is filled in on exit with
+    'rss_delta_bytes', the change in the process's resident set size (None without /proc), and
+    'peak_traced_bytes', the peak Python heap (None unless DEPLOY_TRACE_MEMORY is set).
+
+    Both are process-wide: tasks running at the same time in the process (a threads pool) are
+    included, and the heap peak is since tracing started for the first of any overlapping blocks.
+    """
+    report = {'peak_traced_bytes': None}
+    if TRACE_MEMORY:
+        _start_tracing()
+    rss_before = current_rss_bytes()
+    try:
+        yield report
+    finally:
+        rss_after = current_rss_bytes()
+        report['rss_delta_bytes'] = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+        if TRACE_MEMORY:
+            report['peak_traced_bytes'] = _stop_tracing()
@@ -0,0 +1,5 @@
+# Entry point for chatbot functions deployed in layer mode.
+# The chatbot runtime (lambda_function and its dependencies) is provided by the shared
+# runtime layer under /opt/python; the function package only carries this shim and
+# app/config/config.yaml, which the runtime reads through USER_CONFIG.
+from lambda_function import handler  # noqa: F401
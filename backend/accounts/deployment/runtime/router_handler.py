@@ -0,0 +1,82 @@
+# Entry point for the pooled router function used in router mode.
+# One function serves every bot: the request path /user/{id}/agent/v0/{name}/chat is resolved
+# to that bot's config.yaml in the config store, cached in-process (LRU with a TTL, revalidated
+# by ETag), and handed to the chatbot runtime from the shared layer through USER_CONFIG.
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+
+import boto3
+from botocore.exceptions import ClientError
+
+import lambda_function
+
+CONFIG_BUCKET = os.environ['ROUTER_CONFIG_BUCKET']
+CONFIG_PREFIX = os.environ.get('ROUTER_CONFIG_PREFIX', 'router-configs/')
+CONFIG_TTL = float(os.environ.get('ROUTER_CONFIG_TTL', '30'))
+CONFIG_CACHE_SIZE = int(os.environ.get('ROUTER_CONFIG_CACHE_SIZE', '256'))
+CONFIG_ROOT = '/tmp/router-configs'
+
+ROUTE = re.compile(r'^/user/(?P<user_id>\d+)/agent/v0/(?P<bot_name>[A-Za-z0-9_-]+)/chat/?$')
+
+s3_client = boto3.client('s3')
+
+# config store key -> (validated_at, etag, local path), least recently used first
+_configs = OrderedDict()
+
+
+def _evict(key):
+    _, _, path = _configs.pop(key)
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def load_config(user_id, bot_name):
+    """Returns a local path to the bot's config, or None if the bot is not published."""
+    key = f"{CONFIG_PREFIX}user_{user_id}/{bot_name}/config.yaml"
+    now = time.monotonic()
+    entry = _configs.get(key)
+    if entry and now - entry[0] < CONFIG_TTL:
+        _configs.move_to_end(key)
+        return entry[2]
+
+    request = {'Bucket': CONFIG_BUCKET, 'Key': key}
+    if entry:
+        request['IfNoneMatch'] = entry[1]
+    try:
+        response = s3_client.get_object(**request)
+    except ClientError as e:
+        code = e.response.get('Error', {}).get('Code')
+        if code == '304':
+            _configs[key] = (now, entry[1], entry[2])
+            _configs.move_to_end(key)
+            return entry[2]
+        if code in ('NoSuchKey', '404'):
+            if entry:
+                _evict(key)
+            return None
+        raise
+
+    path = os.path.join(CONFIG_ROOT, f"user_{user_id}", bot_name, 'config.yaml')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        for chunk in response['Body'].iter_chunks():
+            f.write(chunk)
+    _configs[key] = (now, response['ETag'], path)
+    _configs.move_to_end(key)
+    while len(_configs) > CONFIG_CACHE_SIZE:
+        _evict(next(iter(_configs)))
+    return path
+
+
+def handler(event, context):
+    match = ROUTE.match(event.get('path') or '')
+    config_path = load_config(match['user_id'], match['bot_name']) if match else None
+    if not config_path:
+        return {'statusCode': 404, 'body': json.dumps({'error': 'Chatbot not found'})}
+    os.environ['USER_CONFIG'] = config_path
+    return lambda_function.handler(event, context)
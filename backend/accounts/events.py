@@ -0,0 +1,127 @@
+import asyncio
+import json
+import logging
+import redis
+import redis.asyncio
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# How long a user's latest task states are kept for clients that connect late
+EVENT_TTL = 60 * 60
+HEARTBEAT_INTERVAL = 15
+# Streams are closed after this long so clients reconnect and spread across event servers
+STREAM_MAX_AGE = 10 * 60
+
+_client = None
+_publish_script = None
+
+# Numbers the event with the user's next sequence value, records it as the task's latest state
+# and publishes it, atomically so the sequence order matches the order states become visible.
+# seq is spliced in as the first key, so ARGV[2] must be a non-empty JSON object; publish_task_event
+# always sends one (it has task_id), and anything else is refused rather than stored malformed.
+PUBLISH_SCRIPT = """
+if string.sub(ARGV[2], 1, 1) ~= '{' or string.sub(ARGV[2], 2, 2) == '}' then
+  return redis.error_reply('task event must be a non-empty JSON object')
+end
+local seq = redis.call('INCR', KEYS[1])
+local event = '{"seq": ' .. seq .. ', ' .. string.sub(ARGV[2], 2)
+redis.call('HSET', KEYS[2], ARGV[1], event)
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+redis.call('PUBLISH', KEYS[3], event)
+return seq
+"""
+
+
+def channel(user_id):
+    return f"task-events:{user_id}"
+
+def latest_key(user_id):
+    return f"task-events:{user_id}:latest"
+
+def sequence_key(user_id):
+    return f"task-events:{user_id}:seq"
+
+def get_redis():
+    """Returns the process-wide Redis client, or None when REDIS_URL is not configured."""
+    global _client
+    if _client is None and settings.REDIS_URL:
+        _client = redis.Redis.from_url(settings.REDIS_URL)
+    return _client
+
+
+def publish_task_event(user_id, task_id, kind, payload):
+    """
+    Pushes a status update for one of the user's tasks to their event stream and remembers it
+    as the task's latest state. kind is 'deployment', 'teardown' or 'bulk_teardown'. Never raises.
+    """
+    global _publish_script
+    client = get_redis()
+    if client is None or not task_id:
+        return
+    event = json.dumps({'task_id': task_id, 'type': kind, **payload}, default=str)
+    try:
+        if _publish_script is None:
+            _publish_script = client.register_script(PUBLISH_SCRIPT)
+        _publish_script(keys=[sequence_key(user_id), latest_key(user_id), channel(user_id)], args=[task_id, event, EVENT_TTL])
+    except redis.RedisError as e:
+        logger.warning(f"Could not publish task event for {task_id}: {str(e)}")
+
+
+def task_states(user_id, task_ids, cursor=0):
+    """
+    Latest states of the user's task_ids, read with a single HMGET.
+
+    Returns (states, cursor): states maps task ID to its latest event for tasks updated after the
+    given cursor, and cursor is the value to send next time. Tasks with no event yet are reported
+    as pending on the first call (cursor 0) only.
+    """
+    values = get_redis().hmget(latest_key(user_id), task_ids)
+    states, latest = {}, cursor
+    for task_id, value in zip(task_ids, values):
+        if value is None:
+            if not cursor:
+                states[task_id] = {'status': 'pending'}
+            continue
+        event = json.loads(value)
+        # States published before events were numbered have no seq; they are reported on the first call
+        sequence = event.pop('seq', 0)
+        latest = max(latest, sequence)
+        if sequence > cursor or not cursor:
+            event.pop('task_id', None)
+            states[task_id] = event
+    return states, latest
+
+
+def sse(data, event='task'):
+    return f"event: {event}\ndata: {data}\n\n"
+
+async def stream_task_events(user_id):
+    """
+    Server-Sent Events for all of the user's tasks: the latest known state of each recent task,
+    then every update as it is published, with comment heartbeats in between.
+    """
+    client = redis.asyncio.Redis.from_url(settings.REDIS_URL)
+    pubsub = client.pubsub()
+    try:
+        # Subscribe before reading the snapshot so nothing published in between is lost
+        await pubsub.subscribe(channel(user_id))
+        yield "retry: 2000\n\n"
+        for event in (await client.hgetall(latest_key(user_id))).values():
+            yield sse(event.decode())
+
+        loop = asyncio.get_running_loop()
+        closes_at = loop.time() + STREAM_MAX_AGE
+        last_sent = loop.time()
+        while loop.time() < closes_at:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=HEARTBEAT_INTERVAL)
+            if message:
+                yield sse(message['data'].decode())
+                last_sent = loop.time()
+            elif loop.time() - last_sent >= HEARTBEAT_INTERVAL:
+                yield ": keepalive\n\n"
+                last_sent = loop.time()
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.aclose()
+        await client.aclose()
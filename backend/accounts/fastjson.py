@@ -0,0 +1,68 @@
+import datetime
+import decimal
+import json
+import uuid
+from itertools import islice
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.functional import Promise
+from rest_framework.renderers import BaseRenderer
+
+try:
+    import orjson
+except ImportError:
+    # The stdlib encoder produces the same output, several times slower
+    orjson = None
+
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS if orjson else 0
+STREAM_CHUNK_ROWS = 500
+
+
+def _default(value):
+    # The formats DRF uses: ISO 8601 with Z for UTC, UUIDs and Decimals as strings
+    if isinstance(value, datetime.datetime):
+        text = value.isoformat()
+        return text[:-6] + 'Z' if text.endswith('+00:00') else text
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (uuid.UUID, decimal.Decimal, Promise)):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(data):
+    """Encodes data as compact JSON bytes, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+    return json.dumps(data, default=_default, separators=(',', ':')).encode()
+
+
+class FastJsonResponse(HttpResponse):
+    """JsonResponse encoded with dumps()."""
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
+
+class FastJSONRenderer(BaseRenderer):
+    """DRF renderer producing the same JSON as JSONRenderer's compact output, with dumps()."""
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return b'' if data is None else dumps(data)
+
+
+def stream_json_array(rows, chunk_rows=STREAM_CHUNK_ROWS):
+    """
+    Streams an iterable of rows as one JSON array, encoding chunk_rows rows per write, so a
+    response of any size is sent without holding all of it in memory.
+    """
+    def chunks():
+        rows_iter = iter(rows)
+        yield b'['
+        separator = b''
+        while batch := list(islice(rows_iter, chunk_rows)):
+            yield separator + dumps(batch)[1:-1]
+            separator = b','
+        yield b']'
+    return StreamingHttpResponse(chunks(), content_type='application/json')
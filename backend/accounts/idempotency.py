@@ -0,0 +1,55 @@
+import logging
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from .metrics import DEDUP_SUPPRESSED
+
+logger = logging.getLogger(__name__)
+
+
+def deploy_key(user_id, relative_file_path):
+    return f"dedup:deploy:{user_id}:{relative_file_path}"
+
+def teardown_key(deployment_id):
+    return f"dedup:teardown:{deployment_id}"
+
+def _kind(key):
+    return key.split(':')[1]
+
+
+def claim(key, lease=None):
+    """
+    Reserves a task ID for the work identified by key.
+
+    Returns (task_id, True) when the caller should enqueue a task under the new ID, or
+    (in_flight_task_id, False) when a task for the same work is already in flight.
+    """
+    lease = settings.TASK_DEDUP_LEASE if lease is None else lease
+    task_id = str(uuid.uuid4())
+    while not cache.add(key, task_id, timeout=lease):
+        in_flight = cache.get(key)
+        if in_flight is not None:
+            DEDUP_SUPPRESSED.labels(_kind(key)).inc()
+            logger.info(f"Attaching duplicate request for {key} to in-flight task {in_flight}")
+            return in_flight, False
+    return task_id, True
+
+def hold(key, task_id, lease=None):
+    """
+    Called by the task itself: takes or renews the lease on key for task_id.
+    Returns False if a different task holds it, i.e. this task is a duplicate.
+    """
+    lease = settings.TASK_DEDUP_LEASE if lease is None else lease
+    if cache.add(key, task_id, timeout=lease) or cache.get(key) == task_id:
+        cache.touch(key, lease)
+        return True
+    DEDUP_SUPPRESSED.labels(_kind(key)).inc()
+    return False
+
+def holder(key):
+    return cache.get(key)
+
+def release(key, task_id):
+    if cache.get(key) == task_id:
+        cache.delete(key)
+
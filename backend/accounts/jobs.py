@@ -0,0 +1,85 @@
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+from .models import DeploymentJob
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATES = ('completed', 'failed')
+
+
+def new_job(task_id, kind, user_id, target=''):
+    """Unsaved job for a task about to be enqueued; views save it (or bulk_create several) first."""
+    return DeploymentJob(task_id=task_id, kind=kind, user_id=user_id, target=str(target)[:255])
+
+def bulk_teardown_target(deployment_ids):
+    return 'all' if deployment_ids is None else ','.join(map(str, deployment_ids))
+
+
+def start_job(task_id, kind, user_id, target=''):
+    """
+    Marks the job running. The row is normally created by the view that enqueued the task;
+    tasks started some other way (management commands, retries after pruning) get one here.
+    """
+    now = timezone.now()
+    try:
+        DeploymentJob.objects.update_or_create(
+            task_id=task_id,
+            defaults={'state': 'running', 'started_at': now},
+            create_defaults={'kind': kind, 'user_id': user_id, 'target': str(target)[:255], 'state': 'running', 'started_at': now},
+        )
+    except DatabaseError as e:
+        logger.warning(f"Could not record start of job {task_id}: {str(e)}")
+
+def record_stage(task_id, stage, stages):
+    try:
+        DeploymentJob.objects.filter(task_id=task_id).update(stage=stage, stages=stages, updated_at=timezone.now())
+    except DatabaseError as e:
+        logger.warning(f"Could not record stage {stage} of job {task_id}: {str(e)}")
+
+def finish_job(task_id, status):
+    """Stores the final status payload of a job, as later returned by job_status."""
+    now = timezone.now()
+    fields = {
+        'state': 'completed' if status.get('status') == 'completed' else 'failed',
+        'error': status.get('error') or '',
+        'result': status,
+        'finished_at': now,
+        'updated_at': now,
+    }
+    if 'stages' in status:
+        fields['stages'] = status['stages']
+    try:
+        DeploymentJob.objects.filter(task_id=task_id).update(**fields)
+    except DatabaseError as e:
+        logger.warning(f"Could not record result of job {task_id}: {str(e)}")
+
+
+def job_status(job):
+    """Status payload of a job in the shape the status views and the event stream use."""
+    if job.state in FINISHED_STATES:
+        return job.result or {'status': 'failed', 'error': job.error or 'Unknown error'}
+    if job.stage:
+        return {'status': 'pending', 'stage': job.stage, 'stages': job.stages}
+    return {'status': 'pending'}
+
+
+def prune_jobs(days=None, batch_size=None):
+    """
+    Deletes jobs created more than days ago, batch_size rows per DELETE so the table is never
+    locked for long. Returns the number of rows deleted.
+    """
+    days = settings.DEPLOYMENT_JOB_RETENTION_DAYS if days is None else days
+    batch_size = batch_size or settings.DEPLOYMENT_JOB_PRUNE_BATCH
+    expired = DeploymentJob.objects.filter(created_at__lt=timezone.now() - timedelta(days=days))
+    deleted = 0
+    while True:
+        ids = list(expired.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        # No signals or cascades on DeploymentJob, so this is a single DELETE ... WHERE id IN (...)
+        deleted += DeploymentJob.objects.filter(id__in=ids).delete()[0]
+    logger.info(f"Pruned {deleted} deployment job(s) older than {days} day(s)")
+    return deleted
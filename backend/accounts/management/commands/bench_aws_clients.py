@@ -0,0 +1,49 @@
+import os
+import statistics
+import time
+import boto3
+from django.core.management.base import BaseCommand
+from backend.accounts.deployment.aws_utils.clients import ClientRegistry
+
+SERVICES = ['lambda', 'apigateway', 's3']
+
+
+class Command(BaseCommand):
+    help = "Measures per-task AWS client setup overhead: fresh boto3 clients versus the pooled client registry."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help="Simulated tasks per strategy.")
+        parser.add_argument('--region', default=os.environ.get('AWS_REGION', 'us-east-1'))
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        region = options['region']
+
+        def fresh_clients():
+            for service_name in SERVICES:
+                boto3.client(service_name, region_name=region)
+
+        registry = ClientRegistry()
+        started = time.perf_counter()
+        registry.warm(SERVICES, region)
+        warm_ms = (time.perf_counter() - started) * 1000
+
+        def pooled_clients():
+            for service_name in SERVICES:
+                registry.client(service_name, region)
+
+        before = self._measure(fresh_clients, iterations)
+        after = self._measure(pooled_clients, iterations)
+
+        self.stdout.write(f"Per-task client setup for {', '.join(SERVICES)} over {iterations} tasks:")
+        self.stdout.write(f"  boto3.client per task: mean {statistics.mean(before):.2f} ms, p50 {statistics.median(before):.2f} ms, max {max(before):.2f} ms")
+        self.stdout.write(f"  pooled registry:       mean {statistics.mean(after):.4f} ms, p50 {statistics.median(after):.4f} ms, max {max(after):.4f} ms")
+        self.stdout.write(f"  one-time warm-up at worker_process_init: {warm_ms:.2f} ms")
+
+    def _measure(self, setup, iterations):
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            setup()
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
@@ -0,0 +1,94 @@
+import json
+import shutil
+import tempfile
+import time
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import RequestFactory
+from django.test.utils import setup_test_environment, teardown_test_environment, teardown_databases
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from backend.accounts import fastjson
+from backend.accounts.models import UploadedFile, Deployment
+from backend.accounts.serializers import FileUploadSerializer, DeploymentSerializer, file_rows, deployment_rows
+from backend.accounts.benchmarks import setup_bench_database
+from .seed_tenants import seed_tenant
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures list rendering throughput in rows per second: ModelSerializer + DRF's JSONRenderer versus "
+        ".values() rows shaped by the fast-path row builders, encoded with the stdlib and with orjson. "
+        "Each strategy includes its query. Runs against a seeded tenant in a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000, help="Files (and deployments) in the seeded tenant.")
+        parser.add_argument('--repeat', type=int, default=5, help="Runs per strategy; the best is reported.")
+        parser.add_argument('--output', help="Also write the results as JSON to this path.")
+
+    def handle(self, *args, **options):
+        workdir = tempfile.mkdtemp(prefix='bench_json_')
+        setup_test_environment(debug=False)
+        old_config = setup_bench_database(workdir)
+        try:
+            user = seed_tenant('bench-json', options['rows'], options['rows'])
+            request = Request(RequestFactory().get('/'))
+            results = {
+                'files': self._compare(
+                    UploadedFile.objects.filter(user=user).order_by('-uploaded_at', '-id'),
+                    FileUploadSerializer, file_rows, request, options['repeat'],
+                ),
+                'deployments': self._compare(
+                    Deployment.objects.filter(user=user).select_related('config_file').order_by('-deployed_at', '-id'),
+                    DeploymentSerializer, deployment_rows, request, options['repeat'],
+                ),
+            }
+        finally:
+            connections.close_all()
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        if fastjson.orjson is None:
+            self.stderr.write("orjson is not installed; the orjson rows use the stdlib fallback.")
+        for name, strategies in results.items():
+            self.stdout.write(f"{name} ({options['rows']} rows):")
+            baseline = strategies['serializer + JSONRenderer']
+            for strategy, rows_per_second in strategies.items():
+                self.stdout.write(f"  {strategy:<34}{rows_per_second:>12,.0f} rows/s  {rows_per_second / baseline:>5.1f}x")
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'rows': options['rows'], 'orjson': fastjson.orjson is not None, 'rows_per_second': results}, f, indent=2)
+
+    def _compare(self, queryset, serializer_class, row_builder, request, repeat):
+        renderer = JSONRenderer()
+        columns, build = row_builder(request)
+
+        def serializer():
+            data = serializer_class(list(queryset), many=True, context={'request': request}).data
+            return renderer.render(data)
+
+        def values_stdlib():
+            return json.dumps([build(row) for row in queryset.values(*columns)], default=fastjson._default, separators=(',', ':')).encode()
+
+        def values_fast():
+            return fastjson.dumps([build(row) for row in queryset.values(*columns)])
+
+        if json.loads(serializer()) != json.loads(values_fast()):
+            raise AssertionError(f"Fast path output differs from {serializer_class.__name__}")
+        rows = queryset.count()
+        return {
+            'serializer + JSONRenderer': self._rows_per_second(serializer, rows, repeat),
+            'values() + stdlib json': self._rows_per_second(values_stdlib, rows, repeat),
+            'values() + orjson': self._rows_per_second(values_fast, rows, repeat),
+        }
+
+    def _rows_per_second(self, render, rows, repeat):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            render()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return rows / best
@@ -0,0 +1,205 @@
+import json
+import logging
+import os
+import resource
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from zipfile import ZipFile, ZIP_STORED
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import InMemoryStorage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import teardown_databases
+from backend.accounts.models import UploadedFile, Deployment, DeploymentJob
+from backend.accounts.jobs import new_job, FINISHED_STATES
+from backend.accounts.benchmarks import percentile, setup_bench_database
+from backend.accounts.deployment.aws_utils import deploy_lambda
+from backend.accounts.deployment.aws_utils.clients import registry
+from backend.accounts.deployment.aws_utils.fake_aws import FakeAWS
+
+CONFIG_TEMPLATE = "name: {name}\nmodel: gpt-4o-mini\nprompt: You are a helpful assistant.\n"
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks deploys and teardowns end to end: N deploys, then their teardowns, run through a real Celery "
+        "worker against the in-process AWS fake (fake_aws.py). Reports throughput, latency percentiles and peak "
+        "memory. Runs in a throwaway test database and an in-memory broker, never against real AWS or data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--deploys', type=int, default=20, help="Number of deploys (and teardowns) to run.")
+        parser.add_argument('--files-per-user', type=int, default=1, help="Deploys per user; DEPLOY_MAX_CONCURRENCY_PER_USER applies per user.")
+        parser.add_argument('--concurrency', type=int, default=8, help="Worker threads.")
+        parser.add_argument('--package-mb', type=float, default=2, help="Size of the synthetic deployment package.")
+        parser.add_argument('--latency-scale', type=float, default=1.0, help="Multiplier for the fake's per-operation latencies.")
+        parser.add_argument('--update-seconds', type=float, default=1.0, help="How long functions stay InProgress after a change.")
+        parser.add_argument('--lambda-rps', type=float, default=15, help="Fake Lambda throttling threshold, requests/second (0 disables).")
+        parser.add_argument('--apigateway-rps', type=float, default=10, help="Fake API Gateway throttling threshold, requests/second (0 disables).")
+        parser.add_argument('--no-rate-limits', action='store_true', help="Ignore the Celery task rate limits from settings.")
+        parser.add_argument('--timeout', type=float, default=600, help="Seconds to wait for each phase.")
+        parser.add_argument('--output', help="Also write the report as JSON to this path.")
+
+    def handle(self, *args, **options):
+        if options['verbosity'] < 2:
+            logging.disable(logging.INFO)
+        workdir = tempfile.mkdtemp(prefix='bench_pipeline_')
+        old_config = setup_bench_database(workdir)
+        try:
+            fake = self._setup_environment(options, workdir)
+            worker = self._start_worker(options)
+            rss_before = self._max_rss()
+            files = self._seed(options)
+
+            deploy = self._run_phase('deploy', options, [
+                (new_job(str(uuid.uuid4()), 'deployment', file.user_id, file.file.name), (file.user_id, file.file.name))
+                for file in files
+            ])
+            deployments = Deployment.objects.filter(user_id__in={file.user_id for file in files}, status='active')
+            teardown = self._run_phase('teardown', options, [
+                (new_job(str(uuid.uuid4()), 'teardown', deployment.user_id, deployment.id), (deployment.user_id, deployment.id))
+                for deployment in deployments
+            ])
+
+            report = {
+                'options': {key: options[key] for key in ('deploys', 'files_per_user', 'concurrency', 'package_mb', 'latency_scale', 'update_seconds', 'lambda_rps', 'apigateway_rps', 'no_rate_limits')},
+                'phases': {'deploy': deploy, 'teardown': teardown},
+                'aws': fake.stats(),
+                'memory': {'max_rss_before_bytes': rss_before, 'max_rss_bytes': self._max_rss()},
+            }
+            worker.stop(in_sighandler=False)
+        finally:
+            connections.close_all()
+            teardown_databases(old_config, verbosity=0)
+            shutil.rmtree(workdir, ignore_errors=True)
+            logging.disable(logging.NOTSET)
+
+        self._print(report)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Wrote {options['output']}")
+
+    def _setup_environment(self, options, workdir):
+        fake = FakeAWS(
+            latency_scale=options['latency_scale'],
+            update_seconds=options['update_seconds'],
+            rate_limits={'lambda': options['lambda_rps'], 'api-gateway': options['apigateway_rps']},
+        )
+        os.environ.update({
+            'AWS_REGION': fake.region,
+            'AWS_ACCOUNT_ID': fake.account_id,
+            'AWS_ACCESS_KEY_ID': 'bench',
+            'AWS_SECRET_ACCESS_KEY': 'bench',
+            'LAMBDA_EXECUTION_ROLE': f"arn:aws:iam::{fake.account_id}:role/bench",
+            'EXISTING_API_GATEWAY_ID': fake.api_id,
+            'LAMBDA_DEPLOY_MODE': 'bundled',
+            'OPENAI_API_KEY': 'bench',
+            'CELERY_METRICS_PORT': '0',
+        })
+        os.environ.pop('LAMBDA_ARTIFACT_BUCKET', None)
+        registry.reset()
+        fake.install(registry)
+
+        package_path = os.path.join(workdir, 'deployment_package.zip')
+        with ZipFile(package_path, 'w') as zipf:
+            zipf.writestr('lambda_function.py', "def handler(event, context):\n    return {'statusCode': 200}\n")
+            zipf.writestr('payload.bin', os.urandom(int(options['package_mb'] * 1024 * 1024)), compress_type=ZIP_STORED)
+        deploy_lambda.deployment_package_path = package_path
+        UploadedFile._meta.get_field('file').storage = InMemoryStorage()
+        return fake
+
+    def _start_worker(self, options):
+        from backend.celery import app
+        from backend.accounts.tasks import deploy_chat_app, teardown_chat_app
+        # The app reads its settings under the CELERY_ namespace, so overrides need the prefixed names
+        app.conf.update(CELERY_BROKER_URL='memory://', CELERY_RESULT_BACKEND='cache+memory://')
+        if options['no_rate_limits']:
+            deploy_chat_app.rate_limit = teardown_chat_app.rate_limit = None
+        worker = app.Worker(
+            pool='threads', concurrency=options['concurrency'], queues=['deploy', 'teardown', 'light'],
+            hostname=f"bench-{uuid.uuid4().hex[:6]}@localhost", quiet=True, loglevel='WARNING', redirect_stdouts=False,
+            without_heartbeat=True, without_mingle=True, without_gossip=True,
+        )
+        threading.Thread(target=worker.start, daemon=True).start()
+        return worker
+
+    def _seed(self, options):
+        users = {}
+        files = []
+        for index in range(options['deploys']):
+            user_index = index // options['files_per_user']
+            if user_index not in users:
+                users[user_index] = get_user_model().objects.create_user(f"bench{user_index}", f"bench{user_index}@example.com")
+            name = f"bot{index}"
+            files.append(UploadedFile.objects.create(
+                user=users[user_index], file=ContentFile(CONFIG_TEMPLATE.format(name=name), name=f"{name}.yaml"),
+                file_name=f"{name}.yaml", chat_configuration_name=name,
+            ))
+        return files
+
+    def _run_phase(self, name, options, jobs):
+        from backend.accounts.tasks import deploy_chat_app, teardown_chat_app
+        task = deploy_chat_app if name == 'deploy' else teardown_chat_app
+        started = time.monotonic()
+        DeploymentJob.objects.bulk_create([job for job, _ in jobs])
+        for job, args in jobs:
+            task.apply_async(args=args, task_id=job.task_id)
+
+        task_ids = [job.task_id for job, _ in jobs]
+        finished = DeploymentJob.objects.filter(task_id__in=task_ids, state__in=FINISHED_STATES)
+        while finished.count() < len(task_ids):
+            if time.monotonic() - started > options['timeout']:
+                raise CommandError(f"{name}: only {finished.count()} of {len(task_ids)} tasks finished within {options['timeout']:g}s.")
+            time.sleep(0.25)
+        wall = time.monotonic() - started
+
+        rows = list(DeploymentJob.objects.filter(task_id__in=task_ids))
+        latencies = [(row.finished_at - row.created_at).total_seconds() for row in rows]
+        waits = [(row.started_at - row.created_at).total_seconds() for row in rows if row.started_at]
+        stages = defaultdict(list)
+        for row in rows:
+            for stage in row.stages:
+                if stage.get('duration') is not None:
+                    stages[stage['name']].append(stage['duration'])
+        return {
+            'tasks': len(rows),
+            'completed': sum(row.state == 'completed' for row in rows),
+            'failed': sum(row.state == 'failed' for row in rows),
+            'errors': sorted({row.error for row in rows if row.error})[:5],
+            'wall_seconds': round(wall, 3),
+            'throughput_per_second': round(len(rows) / wall, 3) if wall else 0,
+            'latency_p50_seconds': percentile(latencies, 50),
+            'latency_p99_seconds': percentile(latencies, 99),
+            'start_wait_p50_seconds': percentile(waits, 50),
+            'stage_p50_seconds': {stage: percentile(durations, 50) for stage, durations in stages.items()},
+        }
+
+    def _max_rss(self):
+        # ru_maxrss is reported in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def _print(self, report):
+        for name, phase in report['phases'].items():
+            self.stdout.write(f"{name}: {phase['completed']}/{phase['tasks']} completed, {phase['failed']} failed in {phase['wall_seconds']:.2f}s "
+                              f"({phase['throughput_per_second']:.2f}/s)")
+            if not phase['tasks']:
+                continue
+            self.stdout.write(f"  latency p50 {phase['latency_p50_seconds']:.2f}s, p99 {phase['latency_p99_seconds']:.2f}s; "
+                              f"start wait p50 {phase['start_wait_p50_seconds'] or 0:.2f}s")
+            if phase['stage_p50_seconds']:
+                self.stdout.write("  stage p50: " + ', '.join(f"{stage} {seconds:.2f}s" for stage, seconds in phase['stage_p50_seconds'].items()))
+            for error in phase['errors']:
+                self.stderr.write(f"  error: {error}")
+        aws = report['aws']
+        self.stdout.write(f"AWS calls: {sum(aws['calls'].values())}, throttled: {sum(aws['throttled'].values())} {aws['throttled']}, "
+                          f"conflicts: {sum(aws['conflicts'].values())}, stage deployments: {aws['stage_deployments']}")
+        memory = report['memory']
+        self.stdout.write(self.style.SUCCESS(
+            f"Peak RSS {memory['max_rss_bytes'] / 2**20:.1f} MB (was {memory['max_rss_before_bytes'] / 2**20:.1f} MB before the run)"
+        ))
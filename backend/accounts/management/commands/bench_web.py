@@ -0,0 +1,218 @@
+import itertools
+import logging
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+from django.conf import settings
+from django.core.files.storage import InMemoryStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment, teardown_databases
+from django.urls import reverse
+from backend.accounts import urls as account_urls
+from backend.accounts.models import UploadedFile, DeploymentJob
+from backend.accounts.benchmarks import percentile, setup_bench_database, load_baseline, save_baseline
+from .seed_tenants import seed_tenant
+
+SCENARIOS = ('library', 'deployments', 'files', 'upload', 'deploy', 'deployment_status', 'teardown_status', 'task_status')
+# The mock versions of these sleep to imitate Celery, so there is nothing to measure
+PRODUCTION_ONLY = ('deploy', 'deployment_status', 'teardown_status', 'task_status')
+
+
+class Tenant:
+    """A seeded user and the IDs the scenarios cycle through."""
+
+    def __init__(self, user):
+        self.user = user
+        self.undeployed_files = itertools.cycle(
+            UploadedFile.objects.filter(user=user, has_deployment=False).values_list('id', flat=True) or [0]
+        )
+        jobs = DeploymentJob.objects.filter(user=user)
+        self.deployment_tasks = itertools.cycle(jobs.filter(kind='deployment').values_list('task_id', flat=True) or ['missing'])
+        self.teardown_tasks = itertools.cycle(jobs.filter(kind='teardown').values_list('task_id', flat=True) or ['missing'])
+        self.lock = threading.Lock()
+
+    def next(self, ids):
+        with self.lock:
+            return next(ids)
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-tests the account views (library, deployments, files, upload, deploy and the status endpoints) "
+        "as seeded large tenants and reports requests per second, latency percentiles and queries per request. "
+        "Runs in a throwaway test database; results can be saved as a baseline and compared against one. "
+        "Set DJANGO_ENV=production to include the deploy and status endpoints."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenants', type=int, default=2)
+        parser.add_argument('--files', type=int, default=5000, help="UploadedFiles per tenant.")
+        parser.add_argument('--deployments', type=int, default=2000, help="Deployments per tenant.")
+        parser.add_argument('--jobs', type=int, default=500, help="Finished DeploymentJobs per tenant.")
+        parser.add_argument('--requests', type=int, default=200, help="Measured requests per scenario.")
+        parser.add_argument('--warmup', type=int, default=5, help="Unmeasured requests per thread before each scenario.")
+        parser.add_argument('--concurrency', type=int, default=4, help="Client threads.")
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS), help="Comma-separated subset of: " + ', '.join(SCENARIOS))
+        parser.add_argument('--keepdb', action='store_true', help="Keep the test database and its seeded tenants for the next run.")
+        parser.add_argument('--save-baseline', help="Write the results as JSON to this path.")
+        parser.add_argument('--compare', help="Compare against a baseline written by --save-baseline.")
+        parser.add_argument('--max-regression', type=float, help="With --compare, fail if any p95 grew by more than this percentage or any query count grew.")
+
+    def handle(self, *args, **options):
+        scenarios = [name for name in options['scenarios'].split(',') if name]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+        production = account_urls.views.__name__.endswith('prod_views')
+        skipped = {}
+        for name in scenarios:
+            if name in PRODUCTION_ONLY and not production:
+                skipped[name] = "needs DJANGO_ENV=production"
+            elif name == 'task_status' and not settings.REDIS_URL:
+                skipped[name] = "needs REDIS_URL"
+        for name, reason in skipped.items():
+            self.stderr.write(f"Skipping {name}: {reason}")
+        scenarios = [name for name in scenarios if name not in skipped]
+
+        if options['verbosity'] < 2:
+            logging.disable(logging.INFO)
+        workdir = os.path.join(tempfile.gettempdir(), 'bench_web') if options['keepdb'] else tempfile.mkdtemp(prefix='bench_web_')
+        os.makedirs(workdir, exist_ok=True)
+        setup_test_environment(debug=False)
+        old_config = setup_bench_database(workdir, keepdb=options['keepdb'])
+        try:
+            self._setup_environment()
+            started = time.monotonic()
+            tenants = [
+                Tenant(seed_tenant(f"loadtest-{index}", options['files'], options['deployments'], options['jobs']))
+                for index in range(options['tenants'])
+            ]
+            self.stdout.write(f"Seeded {options['tenants']} tenant(s) in {time.monotonic() - started:.1f}s")
+            report = {
+                'options': {key: options[key] for key in ('tenants', 'files', 'deployments', 'jobs', 'requests', 'concurrency')},
+                'database': connections['default'].vendor,
+                'scenarios': {name: self._run_scenario(name, tenants, options) for name in scenarios},
+            }
+        finally:
+            connections.close_all()
+            teardown_databases(old_config, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+            if not options['keepdb']:
+                shutil.rmtree(workdir, ignore_errors=True)
+            logging.disable(logging.NOTSET)
+
+        self._print(report)
+        if options['save_baseline']:
+            save_baseline(options['save_baseline'], report)
+            self.stdout.write(f"Saved baseline to {options['save_baseline']}")
+        if options['compare']:
+            self._compare(load_baseline(options['compare']), report, options['max_regression'])
+
+    def _setup_environment(self):
+        # Uploads go to memory, and deploys are enqueued on an in-memory broker with no worker consuming them
+        UploadedFile._meta.get_field('file').storage = InMemoryStorage()
+        from backend.celery import app
+        app.conf.update(CELERY_BROKER_URL='memory://', CELERY_RESULT_BACKEND='cache+memory://')
+
+    def _request(self, name, client, tenant):
+        if name == 'library':
+            return client.get(reverse('library'))
+        if name == 'deployments':
+            return client.get(reverse('deployments'))
+        if name == 'files':
+            return client.get(reverse('file-list'))
+        if name == 'upload':
+            upload = SimpleUploadedFile(f"bench_{uuid.uuid4().hex[:12]}.yaml", b"name: bench\nmodel: gpt-4o-mini\n")
+            return client.post(reverse('file-upload'), {'file': upload})
+        if name == 'deploy':
+            return client.post(reverse('deploy', args=[tenant.next(tenant.undeployed_files)]))
+        if name == 'deployment_status':
+            return client.get(reverse('deployment_status', args=[tenant.next(tenant.deployment_tasks)]))
+        if name == 'teardown_status':
+            return client.get(reverse('teardown_status', args=[tenant.next(tenant.teardown_tasks)]))
+        ids = ','.join(tenant.next(tenant.deployment_tasks) for _ in range(20))
+        return client.get(reverse('task_status'), {'ids': ids})
+
+    def _run_scenario(self, name, tenants, options):
+        concurrency = options['concurrency']
+        per_thread = [options['requests'] // concurrency + (index < options['requests'] % concurrency) for index in range(concurrency)]
+        samples, errors = [], []
+        lock = threading.Lock()
+        barrier = threading.Barrier(concurrency + 1)
+
+        def worker(index):
+            tenant = tenants[index % len(tenants)]
+            client = Client()
+            client.force_login(tenant.user)
+            queries = []
+            count = lambda execute, sql, params, many, context: queries.append(sql) or execute(sql, params, many, context)
+            try:
+                for _ in range(options['warmup']):
+                    self._request(name, client, tenant)
+                barrier.wait()
+                with connections['default'].execute_wrapper(count):
+                    for _ in range(per_thread[index]):
+                        queries.clear()
+                        started = time.perf_counter()
+                        response = self._request(name, client, tenant)
+                        elapsed = time.perf_counter() - started
+                        with lock:
+                            samples.append((elapsed, len(queries)))
+                            if response.status_code >= 400:
+                                errors.append(response.status_code)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(index,)) for index in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+
+        latencies = [elapsed * 1000 for elapsed, _ in samples]
+        queries = [count for _, count in samples]
+        return {
+            'requests': len(samples),
+            'errors': len(errors),
+            'rps': round(len(samples) / wall, 1) if wall else 0,
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'queries_mean': round(statistics.mean(queries), 1),
+            'queries_max': max(queries),
+        }
+
+    def _print(self, report):
+        self.stdout.write(f"{'scenario':<18}{'rps':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}{'errors':>8}")
+        for name, result in report['scenarios'].items():
+            self.stdout.write(
+                f"{name:<18}{result['rps']:>8}{result['p50_ms']:>10}{result['p95_ms']:>10}{result['p99_ms']:>10}"
+                f"{result['queries_mean']:>9}{result['errors']:>8}"
+            )
+
+    def _compare(self, baseline, report, max_regression):
+        regressions = []
+        self.stdout.write("Against baseline:")
+        for name, result in report['scenarios'].items():
+            before = baseline['scenarios'].get(name)
+            if before is None:
+                continue
+            p95_change = (result['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0
+            self.stdout.write(
+                f"  {name}: p95 {before['p95_ms']} -> {result['p95_ms']} ms ({p95_change:+.0f}%), "
+                f"queries {before['queries_mean']} -> {result['queries_mean']}, rps {before['rps']} -> {result['rps']}"
+            )
+            if max_regression is not None and (p95_change > max_regression or result['queries_max'] > before['queries_max']):
+                regressions.append(name)
+        if regressions:
+            raise CommandError(f"Regressed against the baseline: {', '.join(regressions)}")
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from backend.accounts.tasks import bulk_teardown_chat_apps
+
+
+class Command(BaseCommand):
+    help = "Tears down a user's active deployments in one pass, e.g. when decommissioning a tenant."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, required=True, help="User ID whose deployments are torn down.")
+        parser.add_argument('--deployment-ids', type=int, nargs='+', help="Only tear down these deployment IDs.")
+
+    def handle(self, *args, **options):
+        result = bulk_teardown_chat_apps(options['user'], options['deployment_ids'])
+        if 'error' in result:
+            raise CommandError(result['error'])
+
+        for deployment_id, outcome in result['results'].items():
+            if outcome['status'] != 'completed':
+                self.stderr.write(f"Deployment {deployment_id}: {outcome['error']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Tore down {result['completed']} of {result['total']} deployment(s); {result['failed']} failed"
+        ))
@@ -0,0 +1,99 @@
+import json
+import shutil
+import tempfile
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Q
+from django.test.utils import teardown_databases
+from backend.accounts.models import UploadedFile, Deployment, DeploymentJob
+from backend.accounts.benchmarks import setup_bench_database
+from backend.accounts.views.base_views import library_queryset
+from .seed_tenants import seed_tenant
+
+
+def hot_queries(user):
+    """(name, queryset) for each query the account views and deploy/teardown tasks run on every request or task."""
+    file = UploadedFile.objects.filter(user=user, has_deployment=True).first()
+    deployment = Deployment.objects.filter(user=user).first()
+    job = DeploymentJob.objects.filter(user=user).first()
+    return [
+        ('upload: duplicate file name', UploadedFile.objects.filter(user=user, file_name=file.file_name)[:1]),
+        ('rename: chatbot name conflict', UploadedFile.objects.filter(user=user, chat_configuration_name=file.chat_configuration_name).exclude(id=file.id)[:1]),
+        ('deploy task: file by path', UploadedFile.objects.filter(file=file.file.name, user_id=user.id)),
+        ('deploy: already deployed', Deployment.objects.filter(user=user, config_file_path=deployment.config_file_path).exclude(status='inactive')[:1]),
+        ('deploy task: chatbot name taken', Deployment.objects.filter(user_id=user.id, chatbot_name=deployment.chatbot_name).exclude(status='inactive')[:1]),
+        ('bulk deploy: validation', Deployment.objects.filter(user=user).exclude(status='inactive').filter(
+            Q(config_file_path__in=[deployment.config_file_path]) | Q(chatbot_name__in=[deployment.chatbot_name])
+        ).values_list('config_file_path', 'chatbot_name')),
+        ('teardown: live deployments', Deployment.objects.filter(user_id=user.id).exclude(status='inactive')),
+        ('library: first page', library_queryset(user)[:settings.LIBRARY_PAGE_SIZE + 1]),
+        ('files api: first page', UploadedFile.objects.filter(user=user).order_by('-uploaded_at', '-id')[:settings.API_PAGE_SIZE + 1]),
+        ('deployments api: first page', Deployment.objects.filter(user=user).order_by('-deployed_at', '-id')[:settings.API_PAGE_SIZE + 1]),
+        ('job status', DeploymentJob.objects.filter(task_id=job.task_id, user=user, kind=job.kind)[:1]),
+    ]
+
+def plan_nodes(plan):
+    """Every node of a Postgres JSON plan, depth first."""
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs EXPLAIN ANALYZE on the hot lookups of the account views and deploy/teardown tasks against seeded "
+        "tenants in a throwaway PostgreSQL test database, and fails if any plan sequentially scans one of our "
+        "tables. Run it after changing models, indexes or those queries."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenants', type=int, default=10, help="Seeded tenants; the plans are checked as the first.")
+        parser.add_argument('--files', type=int, default=2000, help="UploadedFiles per tenant.")
+        parser.add_argument('--deployments', type=int, default=1000, help="Deployments per tenant.")
+        parser.add_argument('--jobs', type=int, default=500, help="Finished DeploymentJobs per tenant.")
+        parser.add_argument('--keepdb', action='store_true', help="Keep the test database and its seeded tenants for the next run.")
+        parser.add_argument('--verbose-plans', action='store_true', help="Print the full plan of every query.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError(f"Query plans are only checked on PostgreSQL, not {connection.vendor}.")
+        if min(options['tenants'], options['deployments'], options['jobs']) < 1:
+            raise CommandError("The queries are checked against a tenant with deployments and jobs; seed at least one of each.")
+
+        workdir = tempfile.mkdtemp(prefix='query_plans_')
+        old_config = setup_bench_database(workdir, keepdb=options['keepdb'])
+        try:
+            users = [
+                seed_tenant(f"plans-{index}", options['files'], options['deployments'], options['jobs'])
+                for index in range(options['tenants'])
+            ]
+            # Fresh statistics, as autovacuum would have gathered on a live database
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            failures = self._check(users[0], options['verbose_plans'])
+        finally:
+            connections.close_all()
+            teardown_databases(old_config, verbosity=0, keepdb=options['keepdb'])
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        if failures:
+            raise CommandError(f"Sequential scans in: {', '.join(failures)}")
+        self.stdout.write("No sequential scans.")
+
+    def _check(self, user, verbose):
+        tables = {model._meta.db_table for model in (UploadedFile, Deployment, DeploymentJob)}
+        failures = []
+        for name, queryset in hot_queries(user):
+            plan = json.loads(queryset.explain(format='json', analyze=True))[0]
+            nodes = list(plan_nodes(plan['Plan']))
+            scanned = sorted({node['Relation Name'] for node in nodes if node['Node Type'] == 'Seq Scan' and node.get('Relation Name') in tables})
+            indexes = sorted({node['Index Name'] for node in nodes if 'Index Name' in node})
+            if scanned:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f"  SEQ SCAN  {name}: {', '.join(scanned)}"))
+            else:
+                self.stdout.write(f"  ok        {name}: {', '.join(indexes) or 'no index'} ({plan['Execution Time']:.2f} ms)")
+            if verbose or scanned:
+                self.stdout.write(json.dumps(plan['Plan'], indent=2))
+        return failures
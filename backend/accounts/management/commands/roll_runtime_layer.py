@@ -0,0 +1,38 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from backend.accounts.models import Deployment, RuntimeLayer
+from backend.accounts.deployment.aws_utils.clients import get_client
+from backend.accounts.deployment.aws_utils.deploy_lambda import deployment_package_path
+from backend.accounts.deployment.aws_utils.runtime_layer import ensure_runtime_layer, roll_forward
+
+
+class Command(BaseCommand):
+    help = "Moves layer-mode chatbot functions onto a runtime layer version in bulk."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--publish', action='store_true', help="Publish a layer version for the current deployment package first.")
+        parser.add_argument('--version-arn', help="Layer version to roll to. Defaults to the most recently published one.")
+        parser.add_argument('--user', type=int, help="Only roll deployments owned by this user ID.")
+
+    def handle(self, *args, **options):
+        aws_region = os.environ.get('AWS_REGION')
+        if not aws_region:
+            raise CommandError("AWS_REGION environment variable is not set.")
+        lambda_client = get_client('lambda', aws_region)
+
+        if options['publish']:
+            s3_client = get_client('s3', aws_region)
+            layer = ensure_runtime_layer(lambda_client, s3_client, deployment_package_path)
+        elif options['version_arn']:
+            layer = RuntimeLayer.objects.filter(version_arn=options['version_arn']).first()
+        else:
+            layer = RuntimeLayer.objects.order_by('-published_at').first()
+        if not layer:
+            raise CommandError("No runtime layer version found. Use --publish to publish one.")
+
+        deployments = Deployment.objects.all()
+        if options['user']:
+            deployments = deployments.filter(user_id=options['user'])
+
+        rolled = roll_forward(lambda_client, layer, deployments)
+        self.stdout.write(self.style.SUCCESS(f"Rolled {rolled} function(s) forward to {layer}"))
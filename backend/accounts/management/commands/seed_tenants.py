@@ -0,0 +1,75 @@
+import uuid
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from backend.accounts.models import UploadedFile, Deployment, DeploymentJob
+from backend.accounts.versions import bump_user_version
+
+BATCH_SIZE = 1000
+
+
+def seed_tenant(username, files, deployments, jobs=0, password=None):
+    """
+    Creates a user shaped like our largest tenants: files UploadedFiles, the first deployments of
+    them deployed (every tenth one inactive), and jobs finished deploy/teardown jobs. Rows are
+    bulk-inserted and no file contents are written to storage. A user that already has files is
+    left as it is, so seeding can be re-run. Returns the user.
+    """
+    user, created = get_user_model().objects.get_or_create(username=username, defaults={'email': f"{username}@example.com"})
+    if password:
+        user.set_password(password)
+        user.save(update_fields=['password'])
+    if not created and UploadedFile.objects.filter(user=user).exists():
+        return user
+
+    with transaction.atomic():
+        uploaded = UploadedFile.objects.bulk_create([
+            UploadedFile(
+                user=user, file=f"uploads/{username}/config_{index}.yaml", file_name=f"config_{index}.yaml",
+                chat_configuration_name=f"config_{index}_{user.id}", has_deployment=index < deployments,
+            )
+            for index in range(files)
+        ], batch_size=BATCH_SIZE)
+        Deployment.objects.bulk_create([
+            Deployment(
+                user=user, config_file=file, chatbot_name=file.chat_configuration_name, config_file_path=file.file.name,
+                config_file_name=file.file_name, endpoint=f"https://example.execute-api.us-east-1.amazonaws.com/prod/user/{file.chat_configuration_name}",
+                status='inactive' if index % 10 == 9 else 'active', resource_name=f"{file.chat_configuration_name}-{index}",
+            )
+            for index, file in enumerate(uploaded[:deployments])
+        ], batch_size=BATCH_SIZE)
+        now = timezone.now()
+        DeploymentJob.objects.bulk_create([
+            DeploymentJob(
+                task_id=str(uuid.uuid4()), kind='deployment' if index % 2 == 0 else 'teardown', user=user,
+                target=uploaded[index % len(uploaded)].file.name if uploaded else '', state='completed',
+                result={'status': 'completed'}, started_at=now, finished_at=now,
+            )
+            for index in range(jobs)
+        ], batch_size=BATCH_SIZE)
+        bump_user_version(user.id)
+    return user
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds large tenants (users with thousands of files, deployments and jobs) into the configured database "
+        "for load testing. Existing tenants with the same names are left untouched."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenants', type=int, default=3)
+        parser.add_argument('--files', type=int, default=5000, help="UploadedFiles per tenant.")
+        parser.add_argument('--deployments', type=int, default=2000, help="Deployments per tenant.")
+        parser.add_argument('--jobs', type=int, default=500, help="Finished DeploymentJobs per tenant.")
+        parser.add_argument('--prefix', default='loadtest', help="Usernames are <prefix>-<n>.")
+        parser.add_argument('--password', help="Password to set on the tenants, to log in as them.")
+
+    def handle(self, *args, **options):
+        for index in range(options['tenants']):
+            user = seed_tenant(f"{options['prefix']}-{index}", options['files'], options['deployments'], options['jobs'], options['password'])
+            self.stdout.write(
+                f"{user.username}: {UploadedFile.objects.filter(user=user).count()} files, "
+                f"{Deployment.objects.filter(user=user).count()} deployments, {DeploymentJob.objects.filter(user=user).count()} jobs"
+            )
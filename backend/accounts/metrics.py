@@ -0,0 +1,140 @@
+import functools
+import logging
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from celery.signals import before_task_publish
+from prometheus_client import CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import multiprocess
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+# Buckets in seconds. Pipeline stages and tasks wait on AWS for minutes; API calls and views are sub-second.
+LONG_BUCKETS = (0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600, 1200)
+SHORT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+PIPELINE_STAGE_SECONDS = Histogram(
+    'pipeline_stage_duration_seconds', 'Duration of each deploy or teardown stage.',
+    ['kind', 'stage', 'status'], buckets=LONG_BUCKETS,
+)
+TASK_SECONDS = Histogram(
+    'celery_task_duration_seconds', 'Run time of Celery tasks.',
+    ['task', 'state'], buckets=LONG_BUCKETS,
+)
+TASK_WAIT_SECONDS = Histogram(
+    'celery_task_wait_seconds', 'Time from publishing a task (or its ETA) until a worker starts it.',
+    ['task', 'queue'], buckets=LONG_BUCKETS,
+)
+AWS_CALL_SECONDS = Histogram(
+    'aws_api_call_duration_seconds', 'AWS API call latency, including botocore retries.',
+    ['service', 'operation', 'outcome'], buckets=SHORT_BUCKETS,
+)
+AWS_THROTTLES = Counter(
+    'aws_api_throttles_total', 'AWS API attempts rejected with a throttling error.',
+    ['service', 'operation'],
+)
+WAITER_STATE_SECONDS = Histogram(
+    'aws_waiter_state_seconds', 'Time waited-on AWS resources were observed in each state, per poll.',
+    ['state'], buckets=SHORT_BUCKETS,
+)
+VIEW_SECONDS = Histogram(
+    'view_duration_seconds', 'Latency of instrumented views.',
+    ['view', 'method', 'status'], buckets=SHORT_BUCKETS,
+)
+# Hit rate per namespace: hit / (hit + miss). 'bypass' counts lookups made while the cache was off or down.
+USER_CACHE_REQUESTS = Counter(
+    'user_cache_requests_total', 'Per-user page cache lookups by result.',
+    ['namespace', 'result'],
+)
+
+# Deploy and teardown requests or tasks dropped because the same work was already in flight (idempotency.py)
+DEDUP_SUPPRESSED = Counter(
+    'task_dedup_suppressed_total', 'Duplicate deploy or teardown requests and tasks suppressed.',
+    ['kind'],
+)
+
+
+def multiprocess_dir():
+    """Directory gunicorn and Celery prefork children share their metric files through, or None."""
+    return os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+
+if multiprocess_dir():
+    os.makedirs(multiprocess_dir(), exist_ok=True)
+
+def reset_multiprocess_dir():
+    """Clears metric files left by a previous run. Call once in the parent before workers start."""
+    path = multiprocess_dir()
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+def mark_process_dead(pid):
+    if multiprocess_dir():
+        multiprocess.mark_process_dead(pid)
+
+def exposition_registry():
+    """
+    Registry to expose: every process's metrics aggregated from the multiprocess directory when
+    it is set, otherwise this process's own.
+    """
+    if multiprocess_dir():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+class QueueDepthCollector:
+    """Reads the number of ready messages in each queue from the broker at scrape time."""
+
+    def __init__(self, app, queues):
+        self.app = app
+        self.queues = queues
+
+    def collect(self):
+        depth = GaugeMetricFamily('celery_queue_depth', 'Messages waiting in each Celery queue.', labels=['queue'])
+        try:
+            with self.app.connection_for_read() as connection:
+                channel = connection.default_channel
+                for queue in self.queues:
+                    depth.add_metric([queue], channel.queue_declare(queue=queue, passive=True).message_count)
+        except Exception as e:
+            logger.warning(f"Could not read queue depth: {str(e)}")
+        yield depth
+
+def render_metrics(registry):
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+@before_task_publish.connect
+def stamp_published_at(headers=None, **kwargs):
+    # Read back by the worker as task.request.published_at to measure time spent in the queue
+    headers['published_at'] = time.time()
+
+
+@contextmanager
+def time_stage(kind, stage):
+    started = time.monotonic()
+    status = 'failed'
+    try:
+        yield
+        status = 'completed'
+    finally:
+        PIPELINE_STAGE_SECONDS.labels(kind, stage, status).observe(time.monotonic() - started)
+
+def observe_view(name):
+    """Decorator recording the latency of a view under name."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            started = time.monotonic()
+            status = 500
+            try:
+                response = view(request, *args, **kwargs)
+                status = response.status_code
+                return response
+            finally:
+                VIEW_SECONDS.labels(name, request.method, status).observe(time.monotonic() - started)
+        return wrapper
+    return decorator
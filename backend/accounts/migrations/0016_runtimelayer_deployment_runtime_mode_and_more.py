@@ -0,0 +1,35 @@
+# Generated by Django 5.0.14 on 2026-10-18 12:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0015_uploadedfile_chat_configuration_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RuntimeLayer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('layer_name', models.CharField(max_length=140)),
+                ('version', models.PositiveIntegerField()),
+                ('version_arn', models.CharField(max_length=511, unique=True)),
+                ('package_digest', models.CharField(db_index=True, max_length=64)),
+                ('published_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='deployment',
+            name='runtime_mode',
+            field=models.CharField(choices=[('bundled', 'Bundled'), ('layer', 'Shared Layer')], default='bundled', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='deployment',
+            name='runtime_layer',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='deployments', to='accounts.runtimelayer'),
+        ),
+    ]
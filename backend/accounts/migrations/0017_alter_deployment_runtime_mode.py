@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-18 12:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0016_runtimelayer_deployment_runtime_mode_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='deployment',
+            name='runtime_mode',
+            field=models.CharField(choices=[('bundled', 'Bundled'), ('layer', 'Shared Layer'), ('router', 'Pooled Router')], default='bundled', max_length=20),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.14 on 2026-10-18 12:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0018_deploymentjob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='uploadedfile',
+            index=models.Index(fields=['user', 'uploaded_at', 'id'], name='accounts_up_user_id_79cc65_idx'),
+        ),
+    ]
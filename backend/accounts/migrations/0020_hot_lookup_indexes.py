@@ -0,0 +1,37 @@
+# Generated by Django 5.0.14 on 2026-10-18 12:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0019_uploadedfile_library_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='deployment',
+            index=models.Index(fields=['user', 'config_file_path'], name='accounts_de_user_id_817352_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deployment',
+            index=models.Index(fields=['user', 'chatbot_name'], name='accounts_de_user_id_2cbd4a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deployment',
+            index=models.Index(fields=['user', 'deployed_at', 'id'], name='accounts_de_user_id_dbf47a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deployment',
+            index=models.Index(condition=models.Q(('status', 'inactive'), _negated=True), fields=['user', 'status'], name='deployment_user_live_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='uploadedfile',
+            index=models.Index(fields=['user', 'file_name'], name='accounts_up_user_id_5c8b03_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='uploadedfile',
+            index=models.Index(fields=['file', 'user'], name='accounts_up_file_d4255d_idx'),
+        ),
+    ]
@@ -28,10 +28,28 @@ class UploadedFile(models.Model):
 
     class Meta:
         unique_together = ('user', 'chat_configuration_name')
+        indexes = [
+            # Library pages are keyset-paginated on (uploaded_at, id) within a user
+            models.Index(fields=['user', 'uploaded_at', 'id']),
+            # Duplicate-name checks on upload, and the deploy task's lookup by stored path
+            models.Index(fields=['user', 'file_name']),
+            models.Index(fields=['file', 'user']),
+        ]
 
     def __str__(self):
         return f"{self.file_name} ({self.chat_configuration_name})"
 
+# Published versions of the shared chatbot runtime Lambda layer
+class RuntimeLayer(models.Model):
+    layer_name = models.CharField(max_length=140)
+    version = models.PositiveIntegerField()
+    version_arn = models.CharField(max_length=511, unique=True)
+    package_digest = models.CharField(max_length=64, db_index=True)
+    published_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.layer_name}:{self.version}"
+
 # Model for deployments
 class Deployment(models.Model):
     STATUS_CHOICES = [
@@ -39,6 +57,11 @@ class Deployment(models.Model):
         ('inactive', 'Inactive'),
         ('marked_for_deletion', 'Marked for Deletion'),
     ]
+    RUNTIME_MODE_CHOICES = [
+        ('bundled', 'Bundled'),
+        ('layer', 'Shared Layer'),
+        ('router', 'Pooled Router'),
+    ]
     user = models.ForeignKey(get_user_model(), null=True, on_delete=models.SET_NULL)
     config_file = models.ForeignKey(UploadedFile, null=True, blank=True, on_delete=models.SET_NULL, related_name='deployments')
     chatbot_name = models.CharField(max_length=255)
@@ -48,10 +71,58 @@ class Deployment(models.Model):
     deployed_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
     resource_name = models.CharField(max_length=511, blank=True, editable=False)
+    runtime_mode = models.CharField(max_length=20, choices=RUNTIME_MODE_CHOICES, default='bundled')
+    runtime_layer = models.ForeignKey(RuntimeLayer, null=True, blank=True, on_delete=models.SET_NULL, related_name='deployments')
+
+    class Meta:
+        indexes = [
+            # Already-deployed checks before a deploy, by config path and by chatbot name
+            models.Index(fields=['user', 'config_file_path']),
+            models.Index(fields=['user', 'chatbot_name']),
+            # Deployment lists are keyset-paginated on (deployed_at, id) within a user
+            models.Index(fields=['user', 'deployed_at', 'id']),
+            # Teardowns select a user's live deployments; the inactive ones, which accumulate, stay out of it
+            models.Index(fields=['user', 'status'], condition=~models.Q(status='inactive'), name='deployment_user_live_idx'),
+        ]
 
     def __str__(self):
         return self.chatbot_name
 
+# Lifecycle of a deploy or teardown task, so status views don't depend on the Celery result backend
+class DeploymentJob(models.Model):
+    KIND_CHOICES = [
+        ('deployment', 'Deployment'),
+        ('teardown', 'Teardown'),
+        ('bulk_teardown', 'Bulk Teardown'),
+    ]
+    STATE_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    task_id = models.CharField(max_length=255, unique=True)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name='deployment_jobs')
+    target = models.CharField(max_length=255, blank=True)  # Config file path, or deployment ID(s) for teardowns
+    state = models.CharField(max_length=20, choices=STATE_CHOICES, default='queued')
+    stage = models.CharField(max_length=50, blank=True)
+    stages = models.JSONField(default=list, blank=True)
+    error = models.TextField(blank=True)
+    result = models.JSONField(null=True, blank=True)  # Final status payload returned by the status views
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'state']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.task_id} ({self.state})"
+
 class EmailLog(models.Model):
     recipient = models.EmailField()
     subject = models.CharField(max_length=255)
@@ -0,0 +1,51 @@
+import hashlib
+import json
+import logging
+from django.conf import settings
+from django.core.cache import cache
+from .metrics import USER_CACHE_REQUESTS
+from .versions import user_version
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def page_cache_key(user_id, version, namespace, params):
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+    return f"user-cache:{user_id}:{version}:{namespace}:{digest}"
+
+def cached_for_user(user_id, namespace, params, build):
+    """
+    Returns build() for the user's page described by namespace and params (anything JSON
+    serializable), cached for USER_CACHE_TTL seconds under the user's change version (versions.py).
+    Any change to their files or deployments moves the version, so every entry for the user goes
+    stale at once and is left to expire. build() runs uncached if the cache is off or unavailable.
+    """
+    if not settings.USER_CACHE_TTL:
+        USER_CACHE_REQUESTS.labels(namespace, 'bypass').inc()
+        return build()
+    # The version is read before build() queries: if a change lands in between, the fresher
+    # rows are stored under the old version, which nobody reads any more
+    version = user_version(user_id)
+    if version is None:
+        USER_CACHE_REQUESTS.labels(namespace, 'bypass').inc()
+        return build()
+
+    key = page_cache_key(user_id, version[0], namespace, params)
+    try:
+        value = cache.get(key, _MISSING)
+    except Exception as e:
+        logger.warning(f"Could not read {namespace} cache of user {user_id}: {str(e)}")
+        value = _MISSING
+    if value is not _MISSING:
+        USER_CACHE_REQUESTS.labels(namespace, 'hit').inc()
+        return value
+
+    USER_CACHE_REQUESTS.labels(namespace, 'miss').inc()
+    value = build()
+    try:
+        cache.set(key, value, timeout=settings.USER_CACHE_TTL)
+    except Exception as e:
+        logger.warning(f"Could not write {namespace} cache of user {user_id}: {str(e)}")
+    return value
@@ -0,0 +1,34 @@
+import base64
+import binascii
+import json
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+def keyset_after(ordering, values):
+    """
+    Q selecting the rows that come strictly after values in ordering (order_by field names,
+    '-' for descending). The last field must be unique, so that ties on the others are broken.
+    """
+    condition = Q()
+    for index, field in enumerate(ordering):
+        step = Q(**{f"{field.lstrip('-')}__{'lt' if field.startswith('-') else 'gt'}": values[index]})
+        for earlier, value in zip(ordering[:index], values):
+            step &= Q(**{earlier.lstrip('-'): value})
+        condition |= step
+    return condition
+
+def encode_cursor(row, ordering):
+    values = [getattr(row, field.lstrip('-')) for field in ordering]
+    raw = json.dumps([value.isoformat() if hasattr(value, 'isoformat') else value for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, model, ordering):
+    """Values encoded by encode_cursor, converted back with the model's fields, or None if cursor is invalid."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(ordering):
+            return None
+        return [model._meta.get_field(field.lstrip('-')).to_python(value) for field, value in zip(ordering, values)]
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, ValidationError):
+        return None
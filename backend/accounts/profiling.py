@@ -0,0 +1,214 @@
+import functools
+import logging
+import random
+import statistics
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+CACHE_METHODS = ('get', 'get_many', 'set', 'set_many', 'add', 'delete', 'delete_many', 'incr', 'touch', 'has_key')
+
+_current = ContextVar('profile', default=None)
+_report = deque(maxlen=settings.PROFILE_REPORT_SIZE)
+_report_lock = threading.Lock()
+
+
+class Profile:
+    """Timings and query/cache accounting for one request."""
+
+    def __init__(self):
+        self.queries = []  # (sql, params, seconds)
+        self.template_time = 0
+        self.template_depth = 0
+        self.cache_calls = Counter()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.in_cache_call = False
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, repr(params), time.perf_counter() - started))
+
+    def instrument_cache(self, cache, stack):
+        """Counts calls, hits and misses on this request's cache instance until stack closes."""
+        for name in CACHE_METHODS:
+            setattr(cache, name, self._counted(name, getattr(cache, name)))
+            stack.callback(delattr, cache, name)
+
+    def _counted(self, name, method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            if self.in_cache_call:
+                # Backends implement some methods with others (get_many with get); count the outer call only
+                return method(*args, **kwargs)
+            self.in_cache_call = True
+            try:
+                result = method(*args, **kwargs)
+            finally:
+                self.in_cache_call = False
+            self.cache_calls[name] += 1
+            if name == 'get':
+                if result is None:
+                    self.cache_misses += 1
+                else:
+                    self.cache_hits += 1
+            elif name == 'get_many':
+                self.cache_hits += len(result)
+                self.cache_misses += len(args[0] if args else kwargs['keys']) - len(result)
+            return result
+        return wrapper
+
+    def summary(self, request, response, wall):
+        sql_time = sum(seconds for _, _, seconds in self.queries)
+        exact = Counter((sql, params) for sql, params, _ in self.queries)
+        similar = Counter(sql for sql, _, _ in self.queries)
+        match = request.resolver_match
+        return {
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'method': request.method,
+            'status': response.status_code,
+            'at': time.time(),
+            'wall_ms': round(wall * 1000, 2),
+            'sql_count': len(self.queries),
+            'sql_ms': round(sql_time * 1000, 2),
+            'duplicate_queries': len(self.queries) - len(exact),
+            # Same statement with different parameters, the signature of an N+1 loop
+            'repeated_queries': [{'sql': sql, 'count': count} for sql, count in similar.most_common(5) if count > 1],
+            'template_ms': round(self.template_time * 1000, 2),
+            'cache_calls': sum(self.cache_calls.values()),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+        }
+
+
+def server_timing(summary):
+    return ', '.join([
+        f"total;dur={summary['wall_ms']}",
+        f"sql;dur={summary['sql_ms']};desc=\"{summary['sql_count']} queries, {summary['duplicate_queries']} duplicate\"",
+        f"tpl;dur={summary['template_ms']}",
+        f"cache;desc=\"{summary['cache_hits']} hits, {summary['cache_misses']} misses, {summary['cache_calls']} calls\"",
+    ])
+
+
+def instrument_templates():
+    """Wraps Django template rendering so the active profile accumulates top-level render time."""
+    from django.template.backends.django import Template
+    if getattr(Template.render, 'profiled', False):
+        return
+    render = Template.render
+
+    @functools.wraps(render)
+    def timed_render(self, context=None, request=None):
+        profile = _current.get()
+        if profile is None:
+            return render(self, context, request)
+        profile.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, context, request)
+        finally:
+            profile.template_depth -= 1
+            if not profile.template_depth:
+                profile.template_time += time.perf_counter() - started
+
+    timed_render.profiled = True
+    Template.render = timed_render
+
+
+def record(summary):
+    with _report_lock:
+        _report.append(summary)
+    repeated = summary['repeated_queries']
+    if repeated and repeated[0]['count'] >= settings.PROFILE_REPEATED_QUERY_THRESHOLD:
+        logger.warning(f"{summary['view']} ran one query {repeated[0]['count']} times ({summary['sql_count']} queries total): {repeated[0]['sql']}")
+
+def report():
+    """Recent profiles in this process, with per-view aggregates."""
+    with _report_lock:
+        recent = list(_report)
+    views = {}
+    for summary in recent:
+        views.setdefault(summary['view'], []).append(summary)
+    aggregates = {}
+    for view, summaries in views.items():
+        walls = sorted(summary['wall_ms'] for summary in summaries)
+        aggregates[view] = {
+            'requests': len(summaries),
+            'wall_ms_p50': walls[len(walls) // 2],
+            'wall_ms_p95': walls[min(len(walls) - 1, int(len(walls) * 0.95))],
+            'sql_count_mean': round(statistics.mean(summary['sql_count'] for summary in summaries), 1),
+            'sql_ms_mean': round(statistics.mean(summary['sql_ms'] for summary in summaries), 2),
+            'duplicate_queries_max': max(summary['duplicate_queries'] for summary in summaries),
+            'template_ms_mean': round(statistics.mean(summary['template_ms'] for summary in summaries), 2),
+        }
+    return {'views': aggregates, 'recent': recent}
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in per-request profiling: wall time, SQL count and time, duplicate and repeated queries,
+    template render time and cache hits/misses. Works with DEBUG off.
+
+    A request is profiled when it sends an X-Profile header and the user is staff (or the header
+    carries PROFILE_HEADER_TOKEN), or when it is sampled at PROFILE_SAMPLE_RATE. Requested
+    profiles are returned in a Server-Timing header; every profile goes into the in-memory
+    report served by profile_report_view.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        instrument_templates()
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        requested = self.requested(request)
+        if not requested and random.random() >= settings.PROFILE_SAMPLE_RATE:
+            return self.get_response(request)
+
+        profile = Profile()
+        token = _current.set(profile)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile.record_query))
+                profile.instrument_cache(caches['default'], stack)
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        summary = profile.summary(request, response, time.perf_counter() - started)
+        record(summary)
+        if requested:
+            response['Server-Timing'] = server_timing(summary)
+        return response
+
+    async def __acall__(self, request):
+        # The only async view is the event stream, which stays open for minutes; it isn't profiled
+        return await self.get_response(request)
+
+    def requested(self, request):
+        header = request.META.get(PROFILE_HEADER)
+        if not header:
+            return False
+        if settings.PROFILE_HEADER_TOKEN and header == settings.PROFILE_HEADER_TOKEN:
+            return True
+        return request.user.is_authenticated and request.user.is_staff
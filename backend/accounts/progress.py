@@ -0,0 +1,67 @@
+import logging
+import time
+from contextlib import contextmanager
+from django.utils import timezone
+from .events import publish_task_event
+from .jobs import record_stage
+from .metrics import PIPELINE_STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Custom Celery states published while a deploy is in each stage, in the order they run
+DEPLOY_STAGES = {
+    'fetch_config': 'FETCHING_CONFIG',
+    'build_artifact': 'BUILDING_ARTIFACT',
+    'create_function': 'CREATING_FUNCTION',
+    'wait_ready': 'WAITING_FOR_FUNCTION',
+    'publish_config': 'PUBLISHING_CONFIG',
+    'integrate': 'INTEGRATING',
+    'stage_deploy': 'DEPLOYING_STAGE',
+    'permissions': 'SETTING_PERMISSIONS',
+}
+
+
+class DeployProgress:
+    """
+    Collects per-stage timings for one deploy and publishes them as the task's custom state,
+    on its DeploymentJob row and to the user's event stream.
+
+    Without a task (or outside a worker) the timings are still collected, just not published.
+    """
+
+    def __init__(self, task=None, user_id=None):
+        self.task = task
+        self.user_id = user_id
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        entry = {'name': name, 'status': 'running', 'started_at': timezone.now().isoformat(), 'finished_at': None, 'duration': None}
+        self.stages.append(entry)
+        self.publish(name)
+        started = time.monotonic()
+        try:
+            yield entry
+            entry['status'] = 'completed'
+        except Exception:
+            entry['status'] = 'failed'
+            raise
+        finally:
+            entry['finished_at'] = timezone.now().isoformat()
+            duration = time.monotonic() - started
+            entry['duration'] = round(duration, 3)
+            PIPELINE_STAGE_SECONDS.labels('deployment', name, entry['status']).observe(duration)
+            logger.info(f"Deploy stage {name} {entry['status']} in {entry['duration']}s")
+
+    def publish(self, name):
+        if self.task is None or not self.task.request.id:
+            return
+        meta = {'stage': name, 'stages': self.stages}
+        try:
+            self.task.update_state(state=DEPLOY_STAGES[name], meta=meta)
+        except Exception as e:
+            # Progress is informational; never fail a deploy because it could not be reported
+            logger.warning(f"Could not publish deploy progress: {str(e)}")
+        record_stage(self.task.request.id, name, self.stages)
+        if self.user_id is not None:
+            publish_task_event(self.user_id, self.task.request.id, 'deployment', {'status': 'pending', **meta})
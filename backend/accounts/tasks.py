@@ -1,54 +1,127 @@
 # backend/accounts/tasks.py
 
 from celery import shared_task
+from django.conf import settings
 from django.db import transaction
 from django.core.exceptions import ObjectDoesNotExist
 from .models import UploadedFile, Deployment
+from .concurrency import ConcurrencySlots, acquire_all, release_all
+from .progress import DeployProgress
+from .idempotency import deploy_key, teardown_key, hold, holder, release
+from .events import publish_task_event
+from .jobs import start_job, finish_job, prune_jobs, bulk_teardown_target
 from .deployment.aws_utils.deploy_lambda import deploy_user_app
-from .deployment.aws_utils.teardown_lambda import teardown_user_app
+from .deployment.aws_utils.teardown_lambda import teardown_user_app, teardown_user_apps
 from django.shortcuts import get_object_or_404
 import logging
-import tempfile
-import os
+import random
+import uuid
 
 logger = logging.getLogger(__name__)
 
 # backend/accounts/tasks.py
 
-@shared_task(bind=True)
+def deploy_slots(user_id):
+    """Global and per-user parallelism caps for deploys."""
+    return [
+        ConcurrencySlots('deploy', settings.DEPLOY_MAX_CONCURRENCY, settings.DEPLOY_SLOT_LEASE),
+        ConcurrencySlots(f"deploy:user:{user_id}", settings.DEPLOY_MAX_CONCURRENCY_PER_USER, settings.DEPLOY_SLOT_LEASE),
+    ]
+
+def slot_retry_delay():
+    """DEPLOY_SLOT_RETRY_DELAY on average, jittered so deploys that lost the same race don't retry together."""
+    return random.uniform(settings.DEPLOY_SLOT_RETRY_DELAY / 2, settings.DEPLOY_SLOT_RETRY_DELAY * 3 / 2)
+
+# Waits for a deploy slot are capped by DEPLOY_SLOT_MAX_RETRIES, which also fails the job
+@shared_task(bind=True, max_retries=None)
 def deploy_chat_app(self, user_id, relative_file_path):
+    task_id = self.request.id or f"local-{uuid.uuid4().hex}"
+    dedup_key = deploy_key(user_id, relative_file_path)
+    if not hold(dedup_key, task_id):
+        # Redelivered or double-enqueued: another task is already deploying this file
+        in_flight = holder(dedup_key)
+        logger.info(f"Suppressed duplicate deploy of {relative_file_path} for user {user_id}; task {in_flight} is in flight.")
+        result = duplicate_result(in_flight)
+        finish_job(task_id, deploy_status(result))
+        return result
+
+    slots = deploy_slots(user_id)
+    if not acquire_all(slots, task_id):
+        if self.request.retries >= settings.DEPLOY_SLOT_MAX_RETRIES:
+            logger.warning(f"No deploy slot for {relative_file_path} of user {user_id} after {self.request.retries} retries. Giving up.")
+            release(dedup_key, task_id)
+            status = deploy_status({'status': 'failed', 'error': 'Too many deployments in progress. Please try again later.'})
+            finish_job(task_id, status)
+            publish_task_event(user_id, self.request.id, 'deployment', status)
+            return status
+        countdown = slot_retry_delay()
+        logger.info(f"Deploy concurrency limit reached for user {user_id}. Retrying in {countdown:.1f}s.")
+        raise self.retry(countdown=countdown)
+    start_job(task_id, 'deployment', user_id, relative_file_path)
+    progress = DeployProgress(self, user_id)
+    result = None
     try:
-        logger.info(f"Searching for UploadedFile with path: {relative_file_path} for user: {user_id}")
+        result = run_deploy_chat_app(user_id, relative_file_path, progress)
+        if isinstance(result, dict):
+            result.setdefault('stages', progress.stages)
+        return result
+    finally:
+        release_all(slots, task_id)
+        release(dedup_key, task_id)
+        status = deploy_status(result)
+        finish_job(task_id, status)
+        publish_task_event(user_id, self.request.id, 'deployment', status)
 
-        # Query using the relative file path
-        uploaded_file = UploadedFile.objects.get(file=relative_file_path, user_id=user_id)
+def deploy_status(result):
+    """Status of a finished deploy as returned by deployment_status_view and pushed to the event stream."""
+    result = result or {}
+    if result.get('status') == 'completed':
+        return {
+            'status': 'completed',
+            'endpoint': result.get('endpoint'),
+            'file_path': result.get('file_path'),  # Retrieve the relative file path directly from the task result
+            'file_name': result.get('file_name'),  # Retrieve the file name directly from the task result
+            'deployment_id': result.get('deployment_id'),  # Retrieve the deployment ID directly from the task result
+            'stages': result.get('stages', [])
+        }
+    return {'status': 'failed', 'error': result.get('error', 'Unknown error'), 'stages': result.get('stages', [])}
 
-        if uploaded_file.has_deployment:
-            logger.info("Uploaded file has already been deployed.")
-            return {'status': 'failed', 'error': 'Uploaded file has already been deployed.'}
+def duplicate_result(in_flight):
+    return {'status': 'failed', 'error': 'A task for this request is already in progress.', 'duplicate_of': in_flight}
+
+def run_deploy_chat_app(user_id, relative_file_path, progress=None):
+    progress = progress or DeployProgress()
+    try:
+        with progress.stage('fetch_config'):
+            logger.info(f"Searching for UploadedFile with path: {relative_file_path} for user: {user_id}")
+
+            # Query using the relative file path
+            uploaded_file = UploadedFile.objects.get(file=relative_file_path, user_id=user_id)
+
+            if uploaded_file.has_deployment:
+                logger.info("Uploaded file has already been deployed.")
+                return {'status': 'failed', 'error': 'Uploaded file has already been deployed.'}
         
-        try:
-            chat_configuration_name = uploaded_file.chat_configuration_name
-        except:
-            logger.error("Uploaded file does not have a chat configuration name.")
-            return {'status': 'failed', 'error': 'Uploaded file does not have a chat configuration name.'}
+            try:
+                chat_configuration_name = uploaded_file.chat_configuration_name
+            except:
+                logger.error("Uploaded file does not have a chat configuration name.")
+                return {'status': 'failed', 'error': 'Uploaded file does not have a chat configuration name.'}
         
-        # check if file name already exists. Get deployments by user, then check if any of them have the same file name
-        try:
-            if Deployment.objects.filter(user_id=user_id, chatbot_name=chat_configuration_name).exists():
-                logger.info("A deployment with the same name already exists.")
-                return {'status': 'failed', 'error': 'A deployment with the same file name already exists.'}
-        except Exception as e:
-            logger.info(f"Error checking for existing deployments: {str(e)}")
-            return {'status': 'failed', 'error': 'Error checking for existing deployments.'}
-
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            for chunk in uploaded_file.file.chunks():
-                temp_file.write(chunk)
-            temp_file_path = temp_file.name
+            # check if file name already exists. Get deployments by user, then check if any of them have the same file name
+            try:
+                if Deployment.objects.filter(user_id=user_id, chatbot_name=chat_configuration_name).exclude(status='inactive').exists():
+                    logger.info("A deployment with the same name already exists.")
+                    return {'status': 'failed', 'error': 'A deployment with the same file name already exists.'}
+            except Exception as e:
+                logger.info(f"Error checking for existing deployments: {str(e)}")
+                return {'status': 'failed', 'error': 'Error checking for existing deployments.'}
 
-        result = deploy_user_app(user_id, temp_file_path, chat_configuration_name)
-        os.remove(temp_file_path)
+        # The config is streamed from storage straight into the deployment package
+        try:
+            result = deploy_user_app(user_id, uploaded_file.file, chat_configuration_name, progress=progress)
+        finally:
+            uploaded_file.file.close()
 
         if result['status'] == 'completed':
             try:
@@ -65,6 +138,8 @@ def deploy_chat_app(self, user_id, relative_file_path):
                         config_file_name=uploaded_file.file_name,
                         chatbot_name=result['chatbot_name'],
                         endpoint=result['endpoint'],
+                        runtime_mode=result['runtime_mode'],
+                        runtime_layer_id=result['runtime_layer_id'],
                         status='active'
                     )
                     logger.info(f"Deployment created with resource_name: {deployment.resource_name}")
@@ -93,6 +168,38 @@ def deploy_chat_app(self, user_id, relative_file_path):
     
 @shared_task(bind=True)
 def teardown_chat_app(self, user_id, deployment_id):
+    task_id = self.request.id or f"local-{uuid.uuid4().hex}"
+    dedup_key = teardown_key(deployment_id)
+    if not hold(dedup_key, task_id):
+        in_flight = holder(dedup_key)
+        logger.info(f"Suppressed duplicate teardown of deployment {deployment_id}; task {in_flight} is in flight.")
+        result = duplicate_result(in_flight)
+        finish_job(task_id, teardown_status(result))
+        return result
+    start_job(task_id, 'teardown', user_id, deployment_id)
+    result = None
+    try:
+        result = run_teardown_chat_app(user_id, deployment_id)
+        return result
+    finally:
+        release(dedup_key, task_id)
+        status = teardown_status(result)
+        finish_job(task_id, status)
+        publish_task_event(user_id, self.request.id, 'teardown', status)
+
+def teardown_status(result):
+    """Status of a finished teardown as returned by teardown_status_view and pushed to the event stream."""
+    result = result or {}
+    if result.get('status') == 'completed':
+        return {
+            'status': 'completed',
+            'deployment_status': result.get('deployment_status'),
+            'endpoint': result.get('endpoint'),
+            'message': 'Teardown completed successfully.'
+        }
+    return {'status': 'failed', 'error': result.get('error', 'Unknown error')}
+
+def run_teardown_chat_app(user_id, deployment_id):
     deployment = get_object_or_404(Deployment, user__id=user_id, id=deployment_id)
     try:
         logger.info(f"Initiating teardown for user_id: {user_id}, chatbot_name: {deployment.chatbot_name}, endpoint: {deployment.endpoint}")
@@ -106,6 +213,55 @@ def teardown_chat_app(self, user_id, deployment_id):
             'error': str(e)
         }
 
+@shared_task(bind=True)
+def bulk_teardown_chat_apps(self, user_id, deployment_ids=None):
+    """Tears down the given deployments of a user, or all of their active ones when deployment_ids is None."""
+    deployments = Deployment.objects.filter(user_id=user_id).exclude(status='inactive')
+    if deployment_ids is not None:
+        deployments = deployments.filter(id__in=deployment_ids)
+
+    # Deployments another teardown task is already working on are reported, not torn down twice
+    task_id = self.request.id or f"local-{uuid.uuid4().hex}"
+    start_job(task_id, 'bulk_teardown', user_id, bulk_teardown_target(deployment_ids))
+    held, results = [], {}
+    for deployment in deployments:
+        if hold(teardown_key(deployment.id), task_id):
+            held.append(deployment)
+        else:
+            results[deployment.id] = {'status': 'in_progress', 'task_id': holder(teardown_key(deployment.id))}
+    logger.info(f"Initiating bulk teardown of {len(held)} deployment(s) for user_id: {user_id}")
+    try:
+        results.update(teardown_user_apps(held))
+        result = bulk_teardown_result(results)
+    except Exception as e:
+        logger.error(f"Error during bulk teardown: {str(e)}")
+        result = {
+            'status': 'failed',
+            'error': str(e)
+        }
+    finally:
+        for deployment in held:
+            release(teardown_key(deployment.id), task_id)
+    finish_job(task_id, result)
+    publish_task_event(user_id, self.request.id, 'bulk_teardown', result)
+    return result
+
+def bulk_teardown_result(results):
+    counts = {'completed': 0, 'failed': 0, 'in_progress': 0}
+    for result in results.values():
+        counts[result['status']] += 1
+    return {
+        'status': 'completed',
+        'total': len(results),
+        **counts,
+        'results': {str(deployment_id): result for deployment_id, result in results.items()},
+    }
+
+@shared_task
+def prune_deployment_jobs(days=None):
+    """Removes deploy/teardown job records past DEPLOYMENT_JOB_RETENTION_DAYS. Scheduled daily by celery beat."""
+    return prune_jobs(days)
+
 @shared_task
 def test_task():
     return 'Celery is working!'
@@ -1,4 +1,6 @@
 from .models import UploadedFile, Deployment
+from .versions import bump_user_version
+from django.db import transaction
 import logging
 
 logger = logging.getLogger(__name__)
@@ -26,7 +28,7 @@ def mock_deploy_chat_app(user_id, relative_file_path):
             return {'status': 'failed', 'error': 'Uploaded file has already been deployed.'}
         
         # check if file name already exists. Get deployments by user, then check if any of them have the same file name
-        if Deployment.objects.filter(user_id=user_id, config_file_name=uploaded_file.file_name).exists():
+        if Deployment.objects.filter(user_id=user_id, config_file_name=uploaded_file.file_name).exclude(status='inactive').exists():
             print(f"File name: {uploaded_file.file_name}")
             logger.info("A deployment with the same file name already exists.")
             return {'status': 'failed', 'error': 'A deployment with the same file name already exists.'}
@@ -75,4 +77,33 @@ def mock_teardown_operation(user_id, endpoint):
         'status': 'pending',  # Start with a 'pending' status
         'endpoint': endpoint,
         'message': 'Teardown is in progress...'
-    }
\ No newline at end of file
+    }
+
+def mock_bulk_teardown(user_id, deployment_ids=None):
+    """
+    Mock function to simulate tearing down several deployments at once.
+    No AWS calls are made; the deployments are marked inactive with the same set-based updates as production.
+    """
+    deployments = Deployment.objects.filter(user_id=user_id).exclude(status='inactive')
+    if deployment_ids is not None:
+        deployments = deployments.filter(id__in=deployment_ids)
+    deployments = list(deployments.values_list('id', 'endpoint'))
+    ids = [deployment_id for deployment_id, _ in deployments]
+    print(f"Bulk teardown initiated for user {user_id} on {len(ids)} deployment(s)")
+
+    with transaction.atomic():
+        Deployment.objects.filter(id__in=ids).update(status='inactive')
+        UploadedFile.objects.filter(deployments__id__in=ids).update(has_deployment=False)
+        bump_user_version(user_id)
+
+    return {
+        'status': 'completed',
+        'total': len(ids),
+        'completed': len(ids),
+        'failed': 0,
+        'in_progress': 0,
+        'results': {
+            str(deployment_id): {'status': 'completed', 'deployment_status': 'inactive', 'endpoint': endpoint, 'message': 'Teardown successful'}
+            for deployment_id, endpoint in deployments
+        },
+    }
@@ -1,3 +1,263 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from prometheus_client import REGISTRY
+from .deployment.aws_utils.build_cache import BuildCache, read_artifact
+from .deployment.aws_utils.stage_deployments import request_stage_deployment
+from .deployment.aws_utils.teardown_lambda import mark_inactive
+from .idempotency import claim, deploy_key, hold, holder, release
+from .pagination import keyset_after, encode_cursor, decode_cursor
+from .models import UploadedFile, Deployment, DeploymentJob
+from .tasks import deploy_chat_app, run_deploy_chat_app
+from .views.base_views import library_queryset, validate_bulk_deploy
 
-# Create your tests here.
+
+class LibraryQuerysetTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='library', password='password')
+        self.file = UploadedFile.objects.create(
+            user=self.user, file='uploads/a.yaml', file_name='a.yaml', chat_configuration_name='a_1',
+        )
+
+    def deploy(self, status):
+        return Deployment.objects.create(
+            user=self.user, config_file=self.file, chatbot_name='a_1', config_file_path=self.file.file.name,
+            config_file_name=self.file.file_name, endpoint='https://example.com/prod/user/a_1', status=status,
+        )
+
+    def test_live_deployment_counts_as_deployed(self):
+        self.deploy('active')
+        self.assertEqual([file.deployed for file in library_queryset(self.user)], [True])
+        self.assertEqual(list(library_queryset(self.user, deployed=True)), [self.file])
+        self.assertEqual(list(library_queryset(self.user, deployed=False)), [])
+
+    def test_torn_down_file_is_not_deployed(self):
+        self.deploy('inactive')
+        self.assertEqual([file.deployed for file in library_queryset(self.user)], [False])
+        self.assertEqual(list(library_queryset(self.user, deployed=False)), [self.file])
+        self.assertEqual(list(library_queryset(self.user, deployed=True)), [])
+
+
+class BulkDeployValidationTests(TestCase):
+    def test_duplicate_name_within_batch_is_rejected(self):
+        user = get_user_model().objects.create_user(username='bulk', password='password')
+        # a.yaml and a.yml both get the default chatbot name a_<user id>
+        first, second = [
+            UploadedFile.objects.create(user=user, file=f"uploads/{name}", file_name=name, chat_configuration_name=f"a_{user.id}")
+            for name in ('a.yaml', 'a.yml')
+        ]
+        accepted, rejected = validate_bulk_deploy(user, [first.id, second.id])
+        self.assertEqual(accepted, [first])
+        self.assertEqual(rejected, {str(second.id): 'A deployment with the same file name already exists.'})
+
+
+class RedeployTests(TestCase):
+    def deploy(self, user, file):
+        result = {
+            'status': 'completed', 'resource_name': f"bot-{user.id}-a", 'chatbot_name': file.chat_configuration_name,
+            'endpoint': 'https://example.com/prod/user/a_1', 'runtime_mode': 'bundled', 'runtime_layer_id': None,
+        }
+        with mock.patch('backend.accounts.tasks.deploy_user_app', return_value=result):
+            return run_deploy_chat_app(user.id, file.file.name)
+
+    def test_torn_down_file_can_be_deployed_again(self):
+        user = get_user_model().objects.create_user(username='redeploy', password='password')
+        file = UploadedFile.objects.create(user=user, file='uploads/a.yaml', file_name='a.yaml', chat_configuration_name='a_1')
+        self.assertEqual(self.deploy(user, file)['status'], 'completed')
+
+        mark_inactive(Deployment.objects.get(user=user))
+        file.refresh_from_db()
+        self.assertFalse(file.has_deployment)
+        self.assertEqual(validate_bulk_deploy(user, [file.id]), ([file], {}))
+
+        self.assertEqual(self.deploy(user, file)['status'], 'completed')
+        file.refresh_from_db()
+        accepted, rejected = validate_bulk_deploy(user, [file.id])
+        self.assertEqual(accepted, [])
+        self.assertEqual(rejected, {str(file.id): 'Uploaded file has already been deployed.'})
+        self.assertEqual(Deployment.objects.filter(user=user).exclude(status='inactive').count(), 1)
+
+
+class DedupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_claim_hold_release(self):
+        key = deploy_key(1, 'uploads/a.yaml')
+        task_id, claimed = claim(key)
+        self.assertTrue(claimed)
+        # The task holds its own claim; a redelivered copy under another ID does not
+        self.assertTrue(hold(key, task_id))
+        self.assertFalse(hold(key, 'other-task'))
+        self.assertEqual(holder(key), task_id)
+        # Only the holder can release
+        release(key, 'other-task')
+        self.assertEqual(holder(key), task_id)
+        release(key, task_id)
+        self.assertIsNone(holder(key))
+        self.assertTrue(claim(key)[1])
+
+    def suppressed(self):
+        return REGISTRY.get_sample_value('task_dedup_suppressed_total', {'kind': 'deploy'}) or 0
+
+    def test_duplicate_claim_is_suppressed_and_counted(self):
+        key = deploy_key(1, 'uploads/a.yaml')
+        before = self.suppressed()
+        task_id, claimed = claim(key)
+        self.assertTrue(claimed)
+        self.assertEqual(claim(key), (task_id, False))
+        self.assertEqual(self.suppressed(), before + 1)
+
+
+class DeploySlotTests(TestCase):
+    @override_settings(DEPLOY_SLOT_MAX_RETRIES=2)
+    def test_deploy_gives_up_after_max_slot_retries(self):
+        cache.clear()
+        user = get_user_model().objects.create_user(username='slots', password='password')
+        DeploymentJob.objects.create(task_id='slot-task', kind='deployment', user=user, target='uploads/a.yaml')
+        with mock.patch('backend.accounts.tasks.acquire_all', return_value=False):
+            result = deploy_chat_app.apply(args=[user.id, 'uploads/a.yaml'], task_id='slot-task', retries=2).get()
+        self.assertEqual(result['status'], 'failed')
+        self.assertEqual(DeploymentJob.objects.get(task_id='slot-task').state, 'failed')
+        self.assertTrue(claim(deploy_key(user.id, 'uploads/a.yaml'))[1])
+
+
+def build_for(index):
+    def build(path):
+        with open(path, 'wb') as f:
+            f.write(bytes([index]) * 20000)
+    return build
+
+class BuildCacheTests(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+
+    def test_hit_after_miss(self):
+        build_cache = BuildCache(self.cache_dir, max_bytes=10 ** 6)
+        built = build_cache.get_or_build('a', build_for(1))
+        cached = build_cache.get_or_build('a', mock.Mock(side_effect=AssertionError("rebuilt a cached artifact")))
+        self.assertEqual(read_artifact(cached), read_artifact(built))
+        self.assertEqual(cached.code_sha256, built.code_sha256)
+        self.assertEqual(build_cache.stats(), {'hits': 1, 'misses': 1, 'evictions': 0})
+        built.file.close()
+        cached.file.close()
+
+    def test_artifact_stays_readable_after_eviction(self):
+        build_cache = BuildCache(self.cache_dir, max_bytes=10 ** 6)
+        artifact = build_cache.get_or_build('a', build_for(1))
+        os.remove(artifact.path)
+        self.assertIsNone(build_cache.get('a'))
+        self.assertEqual(read_artifact(artifact), bytes([1]) * 20000)
+        artifact.file.close()
+
+    def test_concurrent_eviction(self):
+        # Separate instances over one directory, as separate worker processes share it. The cache
+        # holds three of the twelve entries, so workers constantly evict each other's artifacts.
+        errors = []
+
+        def worker(seed):
+            build_cache = BuildCache(self.cache_dir, max_bytes=60000)
+            for step in range(100):
+                index = (seed * 7 + step) % 12
+                try:
+                    artifact = build_cache.get_or_build(str(index), build_for(index))
+                    with artifact.file:
+                        self.assertEqual(read_artifact(artifact), bytes([index]) * 20000)
+                except Exception as e:
+                    errors.append(repr(e))
+
+        threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        names = [name for name in os.listdir(self.cache_dir) if name.endswith('.zip')]
+        self.assertLessEqual(len(names), 4)
+        self.assertFalse([name for name in os.listdir(self.cache_dir) if name.endswith('.tmp')])
+
+
+class StageDeploymentTests(TestCase):
+    def test_concurrent_changes_share_a_deployment(self):
+        cache.clear()
+        api_client = mock.Mock()
+        errors = []
+
+        def change():
+            try:
+                request_stage_deployment(api_client, 'api', 'prod', window=0.2, deadline=10)
+            except Exception as e:
+                errors.append(repr(e))
+
+        threads = [threading.Thread(target=change) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertGreaterEqual(api_client.create_deployment.call_count, 1)
+        self.assertLess(api_client.create_deployment.call_count, 8)
+        self.assertEqual(cache.get('stage-deploy:api:prod:deployed'), 8)
+
+
+class PaginationTests(TestCase):
+    ordering = ('-uploaded_at', '-id')
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='pages', password='password')
+        for index in range(5):
+            UploadedFile.objects.create(user=self.user, file=f"uploads/{index}.yaml", file_name=f"{index}.yaml", chat_configuration_name=f"bot_{index}")
+
+    def test_keyset_pages_cover_every_row_once(self):
+        files = UploadedFile.objects.filter(user=self.user).order_by(*self.ordering)
+        seen, cursor = [], None
+        while True:
+            page = files
+            if cursor:
+                page = page.filter(keyset_after(self.ordering, decode_cursor(cursor, UploadedFile, self.ordering)))
+            page = list(page[:2])
+            if not page:
+                break
+            seen += [file.id for file in page]
+            cursor = encode_cursor(page[-1], self.ordering)
+        self.assertEqual(seen, [file.id for file in files])
+
+    def test_invalid_cursor(self):
+        for cursor in ('', 'not base64!', encode_cursor(UploadedFile.objects.first(), ('-id',))):
+            self.assertIsNone(decode_cursor(cursor, UploadedFile, self.ordering))
+
+    def test_files_api_follows_next_links(self):
+        self.client.force_login(self.user)
+        seen, url = [], '/api/accounts/files/?page_size=2'
+        while url:
+            body = self.client.get(url).json()
+            seen += [row['id'] for row in body['results']]
+            url = body['next']
+        expected = UploadedFile.objects.filter(user=self.user).order_by(*self.ordering).values_list('id', flat=True)
+        self.assertEqual(seen, list(expected))
+
+
+class ConditionalListTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='etag', password='password')
+        self.client.force_login(self.user)
+
+    def test_not_modified_until_files_change(self):
+        response = self.client.get('/api/accounts/files/')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertEqual(self.client.get('/api/accounts/files/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            UploadedFile.objects.create(user=self.user, file='uploads/a.yaml', file_name='a.yaml', chat_configuration_name='a_1')
+        response = self.client.get('/api/accounts/files/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.json()['results']), 1)
@@ -13,8 +13,11 @@ urlpatterns = [
   path('upload/', views.FileUploadView.as_view(), name='file-upload'),
   path('files/', views.FileListView.as_view(), name='file-list'),
   path('deploy/<int:file_id>/', views.deploy_view, name='deploy'),
+  path('deploy/bulk/', views.bulk_deploy_view, name='bulk_deploy'),
+  path('deploy/bulk/<str:batch_id>/', views.bulk_deploy_status_view, name='bulk_deploy_status'),
   path('deployment_status/<str:task_id>/', views.deployment_status_view, name='deployment_status'),
   path('deployments/', views.deployments_view, name='deployments'),
+  path('deployments/list/', views.DeploymentListView.as_view(), name='deployment-list'),
   
   # Non-API routes
   path('library/', views.library_view, name='library'),
@@ -24,5 +27,10 @@ urlpatterns = [
   path('delete-file/<int:file_id>/', views.delete_file, name='delete_file'),
   path('delete-deployment/<int:deployment_id>/', views.delete_deployment, name='delete_deployment'),
   path('teardown/<int:deployment_id>/', views.teardown_view, name='teardown'),
+  path('teardown/bulk/', views.bulk_teardown_view, name='bulk_teardown'),
+  path('teardown/bulk/<str:task_id>/', views.bulk_teardown_status_view, name='bulk_teardown_status'),
   path('teardown_status/<str:task_id>/', views.teardown_status_view, name='teardown_status'),
+  path('task_status/', views.task_status_view, name='task_status'),
+  path('events/', views.task_events_view, name='task_events'),
+  path('profile/report/', views.profile_report_view, name='profile_report'),
 ]
@@ -0,0 +1,59 @@
+import logging
+import time
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import UploadedFile, Deployment
+
+logger = logging.getLogger(__name__)
+
+
+def version_key(user_id):
+    return f"user-version:{user_id}"
+
+def changed_at_key(user_id):
+    return f"user-changed-at:{user_id}"
+
+
+def user_version(user_id):
+    """
+    Returns (version, changed_at) for the user's files and deployments, or None if the cache is
+    unavailable. version changes whenever any of them do; changed_at is when that last happened.
+    """
+    keys = [version_key(user_id), changed_at_key(user_id)]
+    try:
+        values = cache.get_many(keys)
+        if len(values) < len(keys):
+            # Nothing recorded (or evicted): start a new generation. Seeding the counter from the
+            # clock keeps it ahead of any version a client saw before the eviction.
+            now = time.time()
+            cache.add(keys[0], int(now * 1000), timeout=None)
+            cache.add(keys[1], now, timeout=None)
+            values = cache.get_many(keys)
+        return values[keys[0]], values[keys[1]]
+    except Exception as e:
+        logger.warning(f"Could not read change version of user {user_id}: {str(e)}")
+        return None
+
+def bump_user_version(user_id):
+    """Advances the user's version once the current transaction commits, so readers never see it early."""
+    if user_id is not None:
+        transaction.on_commit(lambda: _bump(user_id))
+
+def _bump(user_id):
+    try:
+        try:
+            cache.incr(version_key(user_id))
+        except ValueError:
+            cache.add(version_key(user_id), int(time.time() * 1000), timeout=None)
+        cache.set(changed_at_key(user_id), time.time(), timeout=None)
+    except Exception as e:
+        logger.warning(f"Could not bump change version of user {user_id}: {str(e)}")
+
+
+# Queryset .update() and bulk_create() bypass these; callers using them bump explicitly
+@receiver([post_save, post_delete], sender=UploadedFile)
+@receiver([post_save, post_delete], sender=Deployment)
+def record_change(sender, instance, **kwargs):
+    bump_user_version(instance.user_id)
@@ -1,19 +1,29 @@
 # backend/accounts/views.py
 
-from ..serializers import UserSerializer, FileUploadSerializer, DeploymentSerializer
+from ..serializers import UserSerializer, FileUploadSerializer, DeploymentSerializer, requested_fields, file_rows, deployment_rows
+from ..fastjson import FastJSONRenderer, stream_json_array
 from ..models import UploadedFile, Deployment, EmailLog
 from ..forms import FileUploadForm, CustomUserCreationForm
+from ..metrics import observe_view, exposition_registry, render_metrics
+from ..profiling import report as profile_report
+from ..pagination import keyset_after, encode_cursor, decode_cursor
+from ..versions import user_version
+from ..pagecache import cached_for_user
+from django.contrib.admin.views.decorators import staff_member_required
 
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from rest_framework import generics
+from rest_framework.pagination import CursorPagination
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from django.contrib.auth import get_user_model, authenticate, login, logout
 from django.urls import reverse_lazy
 from django.views.generic.edit import CreateView
 from django.utils.decorators import method_decorator
 from django.views import View
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse
 from django.core.mail import send_mail, BadHeaderError
 from django.contrib.auth.tokens import default_token_generator
 from django.template.loader import render_to_string
@@ -23,11 +33,86 @@ from django.contrib.sites.shortcuts import get_current_site
 from django.contrib.auth.forms import PasswordResetForm
 from django.conf import settings
 from django.db import transaction
+from django.db.models import Q, Exists, OuterRef
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
 import logging
 import re, json
 
 logger = logging.getLogger(__name__)
 
+def parse_bulk_ids(request, field):
+    """Returns the list of integer IDs posted as JSON under field, or None if the body is invalid."""
+    try:
+        ids = json.loads(request.body).get(field)
+        return [int(item) for item in ids]
+    except (json.JSONDecodeError, AttributeError, TypeError, ValueError):
+        return None
+
+def parse_bulk_teardown(request):
+    """
+    Returns (True, deployment_ids) for a valid bulk teardown body, where deployment_ids is None
+    for {"all": true}, or (False, None) if the body is invalid.
+    """
+    try:
+        if json.loads(request.body).get('all') is True:
+            return True, None
+    except (json.JSONDecodeError, AttributeError):
+        return False, None
+    deployment_ids = parse_bulk_ids(request, 'deployment_ids')
+    return bool(deployment_ids), deployment_ids
+
+def parse_task_status_query(request):
+    """Returns (task_ids, cursor) from ?ids=<id>,<id>&cursor=<n>, or None if the query is invalid."""
+    task_ids = [task_id for task_id in request.GET.get('ids', '').split(',') if task_id]
+    try:
+        cursor = int(request.GET.get('cursor', 0))
+    except ValueError:
+        return None
+    if not task_ids or len(task_ids) > settings.TASK_STATUS_MAX_IDS or cursor < 0:
+        return None
+    return task_ids, cursor
+
+def validate_bulk_deploy(user, file_ids):
+    """
+    Splits file_ids into deployable UploadedFiles and rejections (file ID -> reason)
+    using two queries for the whole batch rather than per-file checks.
+    """
+    files = {file.id: file for file in UploadedFile.objects.filter(user=user, id__in=file_ids)}
+    paths = [file.file.name for file in files.values()]
+    names = [file.chat_configuration_name for file in files.values()]
+    deployed_paths, deployed_names = set(), set()
+    for path, name in Deployment.objects.filter(user=user).exclude(status='inactive').filter(
+            Q(config_file_path__in=paths) | Q(chatbot_name__in=names)).values_list('config_file_path', 'chatbot_name'):
+        deployed_paths.add(path)
+        deployed_names.add(name)
+
+    # Names must also be unique within the batch: a.yaml and a.yml both default to a_<user id>,
+    # and two deploys of one name would race to create the same function
+    accepted, rejected, seen_names = [], {}, set()
+    for file_id in dict.fromkeys(file_ids):
+        file = files.get(file_id)
+        if file is None:
+            rejected[str(file_id)] = 'UploadedFile matching query does not exist.'
+        elif file.has_deployment or file.file.name in deployed_paths:
+            rejected[str(file_id)] = 'Uploaded file has already been deployed.'
+        elif file.chat_configuration_name in deployed_names or file.chat_configuration_name in seen_names:
+            rejected[str(file_id)] = 'A deployment with the same file name already exists.'
+        else:
+            seen_names.add(file.chat_configuration_name)
+            accepted.append(file)
+    return accepted, rejected
+
+def bulk_batch_key(batch_id):
+    return f"bulk-batch:{batch_id}"
+
+def summarize_batch(statuses):
+    """Aggregates per-item statuses into counts for a batch progress response."""
+    progress = {'total': len(statuses), 'pending': 0, 'completed': 0, 'failed': 0}
+    for status in statuses.values():
+        progress[status['status'] if status['status'] in progress else 'pending'] += 1
+    return progress
+
 class CreateUserView(generics.CreateAPIView):
     model = get_user_model()
     permission_classes = [AllowAny]
@@ -103,12 +188,91 @@ class UpdateChatbotNameView(View):
         return bool(re.match(r'^[a-zA-Z0-9_-]+$', name))
 
 
-class FileListView(generics.ListAPIView):
+class FileCursorPagination(CursorPagination):
+    ordering = ('-uploaded_at', '-id')
+    page_size = settings.API_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+
+class DeploymentCursorPagination(FileCursorPagination):
+    ordering = ('-deployed_at', '-id')
+
+class ConditionalListMixin:
+    """
+    Tags list responses with an ETag and Last-Modified taken from the user's change version
+    (versions.py) and answers 304 when the client's copy is current, without querying the list.
+    """
+
+    def list(self, request, *args, **kwargs):
+        # Read the version before the rows: a change in between only makes the next poll refetch
+        version = user_version(request.user.id)
+        if version is None:
+            return super().list(request, *args, **kwargs)
+        counter, changed_at = version
+        etag = quote_etag(f"{request.user.id}-{counter}")
+        response = get_conditional_response(request, etag=etag, last_modified=int(changed_at))
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(changed_at)
+        # Clients may keep a copy but must revalidate it on every use
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+class ValuesListMixin:
+    """
+    Fast path for JSON list responses: rows come from .values() and are shaped by the view's
+    row_builder (serializers.file_rows and friends) instead of a ModelSerializer per object.
+    Pages are cached per user (pagecache.py); ?stream=1 sends the whole list, unpaginated and
+    uncached, as a chunked JSON array. The browsable API still goes through the serializer.
+    """
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    row_builder = None
+
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+        columns, build = self.row_builder(request, requested_fields(request))
+        ordering = self.pagination_class.ordering
+        # The cursor is built from the ordering columns, so they are fetched even when not returned
+        rows = self.get_queryset().order_by(*ordering).values(*dict.fromkeys(columns + [field.lstrip('-') for field in ordering]))
+        if request.query_params.get('stream') == '1':
+            return stream_json_array(build(row) for row in rows.iterator(chunk_size=2000))
+
+        def page():
+            return self.get_paginated_response([build(row) for row in self.paginate_queryset(rows)]).data
+        # The page links are absolute, so the host is part of the key along with the whole query
+        return Response(cached_for_user(request.user.id, type(self).__name__, [request.get_host(), request.get_full_path()], page))
+
+@method_decorator(observe_view('FileListView'), name='dispatch')
+class FileListView(ConditionalListMixin, ValuesListMixin, generics.ListAPIView):
     serializer_class = FileUploadSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = FileCursorPagination
+    row_builder = staticmethod(file_rows)
+
+    def get_queryset(self):
+        files = UploadedFile.objects.filter(user=self.request.user)
+        requested = requested_fields(self.request)
+        if requested:
+            # Load only what is serialized, plus the pagination keys
+            files = files.only('id', 'uploaded_at', *(requested & {'file', 'file_name'}))
+        return files
+
+@method_decorator(observe_view('DeploymentListView'), name='dispatch')
+class DeploymentListView(ConditionalListMixin, ValuesListMixin, generics.ListAPIView):
+    serializer_class = DeploymentSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = DeploymentCursorPagination
+    row_builder = staticmethod(deployment_rows)
 
     def get_queryset(self):
-        return UploadedFile.objects.filter(user=self.request.user)
+        deployments = Deployment.objects.filter(user=self.request.user)
+        requested = requested_fields(self.request)
+        if not requested or 'config_file' in requested:
+            # One JOIN instead of a query per row for the nested file
+            deployments = deployments.select_related('config_file')
+        return deployments
 
 @login_required
 def delete_file(request, file_id):
@@ -124,12 +288,72 @@ def delete_file(request, file_id):
             return JsonResponse({'success': False, 'error': str(e)}, status=500)
     return JsonResponse({'success': False}, status=400)
 
+# Library orderings; each ends with the primary key so keyset pagination has a unique tiebreak
+LIBRARY_SORTS = {
+    'newest': ('-uploaded_at', '-id'),
+    'oldest': ('uploaded_at', 'id'),
+    'name': ('chat_configuration_name', 'id'),
+}
+LIBRARY_DEPLOYED_FILTERS = {'yes': True, 'no': False}
+
+def library_queryset(user, query='', deployed=None, sort='newest'):
+    """The user's files, each annotated with whether it has a live deployment, filtered and ordered in one query."""
+    # Teardowns keep the Deployment row and mark it inactive, so those don't count. The user filter
+    # is redundant but lets Postgres read the subquery from deployment_user_live_idx; without it
+    # the hashed subplan it picks scans every tenant's deployments.
+    files = UploadedFile.objects.filter(user=user).annotate(
+        deployed=Exists(Deployment.objects.filter(user=user, config_file=OuterRef('pk')).exclude(status='inactive'))
+    )
+    if query:
+        files = files.filter(Q(chat_configuration_name__icontains=query) | Q(file_name__icontains=query))
+    if deployed is not None:
+        files = files.filter(deployed=deployed)
+    return files.order_by(*LIBRARY_SORTS[sort])
+
+@observe_view('library_view')
 @login_required
 def library_view(request):
-    files = UploadedFile.objects.filter(user=request.user)
-    for file in files:
-        file.deployed = Deployment.objects.filter(config_file_path=file.file_name, user=request.user).exists()
-    return render(request, 'library.html', {'files': files})
+    sort = request.GET.get('sort') if request.GET.get('sort') in LIBRARY_SORTS else 'newest'
+    query = request.GET.get('q', '').strip()
+    deployed = request.GET.get('deployed', '')
+    # The page links echo the whole query string, so all of it is part of the key
+    files_html = cached_for_user(
+        request.user.id, 'library', [request.GET.urlencode()],
+        lambda: render_library_files(request, query, deployed, sort),
+    )
+    return render(request, 'library.html', {
+        'files_html': files_html,
+        'q': query,
+        'deployed': deployed,
+        'sort': sort,
+    })
+
+def render_library_files(request, query, deployed, sort):
+    """The library's file list and page links for one page, as HTML."""
+    ordering = LIBRARY_SORTS[sort]
+    files = library_queryset(request.user, query, LIBRARY_DEPLOYED_FILTERS.get(deployed), sort)
+
+    # Keyset pagination: the cursor holds the sort values of the last file shown, so every page
+    # is one indexed range query however deep the tenant pages. An invalid cursor shows page one.
+    params = request.GET.copy()
+    after = decode_cursor(params.pop('cursor', [''])[-1], UploadedFile, ordering)
+    first_query = params.urlencode() if after else None
+    if after:
+        files = files.filter(keyset_after(ordering, after))
+    page = list(files[:settings.LIBRARY_PAGE_SIZE + 1])
+    files = page[:settings.LIBRARY_PAGE_SIZE]
+    next_query = None
+    if len(page) > settings.LIBRARY_PAGE_SIZE:
+        params['cursor'] = encode_cursor(files[-1], ordering)
+        next_query = params.urlencode()
+
+    return render_to_string('library_files.html', {
+        'files': files,
+        'q': query,
+        'deployed': deployed,
+        'next_query': next_query,
+        'first_query': first_query,
+    })
 
 @login_required
 def home_view(request):
@@ -144,10 +368,13 @@ def custom_logout(request):
     logout(request)
     return redirect('login')
     
+@observe_view('deployments_view')
 @login_required
 def deployments_view(request):
-    deployments = Deployment.objects.filter(user=request.user)
-    return render(request, 'deployments.html', {'deployments': deployments})
+    deployment_list_html = cached_for_user(request.user.id, 'deployments', [], lambda: render_to_string(
+        'deployment_list.html', {'deployments': Deployment.objects.filter(user=request.user)},
+    ))
+    return render(request, 'deployments.html', {'deployment_list_html': deployment_list_html})
 
 @login_required
 def delete_deployment(request, deployment_id):
@@ -194,4 +421,14 @@ def password_reset_request(request):
                     logger.error(f'Error sending password reset email to {email}: {e}')
     else:
         form = PasswordResetForm()
-    return render(request, 'password_reset.html', {'form': form})
\ No newline at end of file
+    return render(request, 'password_reset.html', {'form': form})
+
+def metrics_view(request):
+    """Prometheus metrics for every gunicorn worker. Scraped on the internal network; nginx does not expose it."""
+    body, content_type = render_metrics(exposition_registry())
+    return HttpResponse(body, content_type=content_type)
+
+@staff_member_required
+def profile_report_view(request):
+    """Recent request profiles collected by ProfilingMiddleware in the gunicorn worker that serves this request."""
+    return JsonResponse(profile_report())
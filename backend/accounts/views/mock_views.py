@@ -1,9 +1,11 @@
 # Mock views to circumvent the need for a Celery worker or long-running tasks
 
 from .base_views import *
-from ..tasks_mock import mock_deploy_chat_app, mock_teardown_operation
+from ..tasks_mock import mock_deploy_chat_app, mock_teardown_operation, mock_bulk_teardown
 import time
+from django.http import HttpResponse
 from django.conf import settings
+from django.core.cache import cache
 from django.db import transaction
 
 settings.deployment_failed = False  # Initialize the deployment_failed variable
@@ -49,7 +51,8 @@ def deployment_status_view(request, task_id):
         'endpoint': 'dummy_endpoint',
         'file_path': 'dummy_file_path',
         'file_name': 'dummy_file_name',
-        'deployment_id': 'dummy_deployment_id'
+        'deployment_id': 'dummy_deployment_id',
+        'stages': []
     })
 
     # return JsonResponse({
@@ -61,6 +64,33 @@ def deployment_status_view(request, task_id):
     # })
 
 
+@login_required
+def bulk_deploy_view(request):
+    file_ids = parse_bulk_ids(request, 'file_ids')
+    if request.method != 'POST' or not file_ids:
+        return JsonResponse({'error': 'Provide file IDs.'}, status=400)
+
+    files, rejected = validate_bulk_deploy(request.user, file_ids)
+    # Deploy synchronously and keep the outcomes for the status view
+    statuses = {str(file.id): mock_deploy_chat_app(user_id=request.user.id, relative_file_path=file.file.name) for file in files}
+    batch_id = 'mock-batch-id'
+    cache.set(bulk_batch_key(batch_id), {'user_id': request.user.id, 'statuses': statuses, 'rejected': rejected})
+    return JsonResponse({'batch_id': batch_id, 'tasks': {file_id: 'mock-task-id' for file_id in statuses}, 'rejected': rejected})
+
+
+@login_required
+def bulk_deploy_status_view(request, batch_id):
+    batch = cache.get(bulk_batch_key(batch_id))
+    if not batch or batch['user_id'] != request.user.id:
+        return JsonResponse({'error': 'Batch not found.'}, status=404)
+    return JsonResponse({
+        'batch_id': batch_id,
+        'progress': summarize_batch(batch['statuses']),
+        'tasks': batch['statuses'],
+        'rejected': batch['rejected'],
+    })
+
+
 @login_required
 def teardown_view(request, deployment_id):
     # Simulate fetching a deployment object (mock)
@@ -116,3 +146,34 @@ def teardown_status_view(request, task_id):
         'endpoint': 'mock_endpoint',
         'message': 'Teardown completed successfully.'
     })
+
+
+@login_required
+def bulk_teardown_view(request):
+    valid, deployment_ids = parse_bulk_teardown(request)
+    if request.method != 'POST' or not valid:
+        return JsonResponse({'error': 'Provide deployment_ids or "all": true.'}, status=400)
+
+    # Tear down synchronously and keep the outcome for the status view
+    result = mock_bulk_teardown(user_id=request.user.id, deployment_ids=deployment_ids)
+    cache.set("mock-task:mock-bulk-teardown-task-id", result)
+    return JsonResponse({'task_id': 'mock-bulk-teardown-task-id'})
+
+
+@login_required
+def bulk_teardown_status_view(request, task_id):
+    result = cache.get(f"mock-task:{task_id}")
+    if result is None:
+        return JsonResponse({'status': 'pending'})
+    return JsonResponse(result)
+
+
+@login_required
+def task_status_view(request):
+    # Mock status views finish tasks as a side effect of being polled, so clients fall back to them
+    return JsonResponse({'error': 'Batched task status is not available with mock views.'}, status=503)
+
+
+def task_events_view(request):
+    # Mock tasks finish synchronously and publish no events; 204 makes the page poll the mock status views instead
+    return HttpResponse(status=204)
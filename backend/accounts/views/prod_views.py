@@ -1,38 +1,100 @@
 from .base_views import *
 
 # Celery / long-running tasks for deployment are defined here for production
-from ..tasks import deploy_chat_app, teardown_chat_app
+from ..tasks import deploy_chat_app, teardown_chat_app, bulk_teardown_chat_apps
+from ..models import DeploymentJob
+from ..jobs import new_job, job_status, bulk_teardown_target
+from ..events import stream_task_events, task_states
+from ..fastjson import FastJsonResponse
+from django.http import StreamingHttpResponse, HttpResponse
+from django.core.cache import cache
+from ..idempotency import claim, release, deploy_key, teardown_key
+from celery import group
+import uuid
 
 @login_required
 def deploy_view(request, file_id):
     config_file = get_object_or_404(UploadedFile, id=file_id, user=request.user)
     
     # if the config file is already deployed, then we can't re-deploy it
-    if Deployment.objects.filter(user=request.user,config_file_path=config_file.file.name).exists():
+    # Torn-down deployments keep their row as inactive and don't block a redeploy
+    if Deployment.objects.filter(user=request.user,config_file_path=config_file.file.name).exclude(status='inactive').exists():
         return JsonResponse({'error': 'This configuration file is already deployed.'})
     
-    task = deploy_chat_app.apply_async(args=[request.user.id, config_file.file.name])  # file.name includes the relative path
-    return JsonResponse({'task_id': task.id})
+    # A repeated request for the same file attaches to the task already deploying it
+    dedup_key = deploy_key(request.user.id, config_file.file.name)
+    task_id, created = claim(dedup_key)
+    if created:
+        job = new_job(task_id, 'deployment', request.user.id, config_file.file.name)
+        job.save()
+        try:
+            deploy_chat_app.apply_async(args=[request.user.id, config_file.file.name], task_id=task_id)  # file.name includes the relative path
+        except Exception:
+            job.delete()
+            release(dedup_key, task_id)
+            raise
+    return JsonResponse({'task_id': task_id, 'duplicate': not created})
+
+def job_status_response(request, task_id, kind):
+    """Status of one of the user's jobs, read with a single query on the task_id index."""
+    job = DeploymentJob.objects.filter(task_id=task_id, user=request.user, kind=kind).first()
+    if job is None:
+        return JsonResponse({'status': 'failed', 'error': 'Task not found.'}, status=404)
+    return FastJsonResponse(job_status(job))
 
 @login_required
 def deployment_status_view(request, task_id):
-    task = deploy_chat_app.AsyncResult(task_id)
-    if task.state == 'SUCCESS':
-        result = task.result
-        if result.get('status') == 'completed':
-            return JsonResponse({
-                'status': 'completed',
-                'endpoint': result.get('endpoint'),
-                'file_path': result.get('file_path'),  # Retrieve the relative file path directly from the task result
-                'file_name': result.get('file_name'),  # Retrieve the file name directly from the task result
-                'deployment_id': result.get('deployment_id')  # Retrieve the deployment ID directly from the task result
-            })
-        else:
-            return JsonResponse({'status': 'failed', 'error': result.get('error', 'Unknown error')})
-    elif task.state == 'FAILURE':
-        return JsonResponse({'status': 'failed', 'error': str(task.info)})
-    else:
-        return JsonResponse({'status': 'pending'})
+    return job_status_response(request, task_id, 'deployment')
+
+@login_required
+def bulk_deploy_view(request):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required.'}, status=405)
+    file_ids = parse_bulk_ids(request, 'file_ids')
+    if not file_ids or len(file_ids) > settings.BULK_DEPLOY_MAX_FILES:
+        return JsonResponse({'error': f'Provide between 1 and {settings.BULK_DEPLOY_MAX_FILES} file IDs.'}, status=400)
+
+    files, rejected = validate_bulk_deploy(request.user, file_ids)
+    batch_id = str(uuid.uuid4())
+    tasks, signatures, claimed, jobs = {}, [], [], []
+    for file in files:
+        dedup_key = deploy_key(request.user.id, file.file.name)
+        task_id, created = claim(dedup_key)
+        tasks[str(file.id)] = task_id
+        if created:
+            claimed.append((dedup_key, task_id))
+            jobs.append(new_job(task_id, 'deployment', request.user.id, file.file.name))
+            signatures.append(deploy_chat_app.s(request.user.id, file.file.name).set(task_id=task_id))
+    if signatures:
+        DeploymentJob.objects.bulk_create(jobs)
+        # Parallelism is capped inside deploy_chat_app, so the whole batch can be enqueued at once
+        try:
+            group(signatures).apply_async()
+        except Exception:
+            DeploymentJob.objects.filter(task_id__in=[job.task_id for job in jobs]).delete()
+            for dedup_key, task_id in claimed:
+                release(dedup_key, task_id)
+            raise
+    cache.set(bulk_batch_key(batch_id), {'user_id': request.user.id, 'tasks': tasks, 'rejected': rejected}, timeout=settings.BULK_BATCH_TTL)
+    logger.info(f"Bulk deploy {batch_id} by user {request.user.id}: {len(tasks)} queued, {len(rejected)} rejected")
+    return JsonResponse({'batch_id': batch_id, 'tasks': tasks, 'rejected': rejected})
+
+@login_required
+def bulk_deploy_status_view(request, batch_id):
+    batch = cache.get(bulk_batch_key(batch_id))
+    if not batch or batch['user_id'] != request.user.id:
+        return JsonResponse({'error': 'Batch not found.'}, status=404)
+    jobs = DeploymentJob.objects.filter(task_id__in=batch['tasks'].values(), user=request.user).in_bulk(field_name='task_id')
+    statuses = {
+        file_id: job_status(jobs[task_id]) if task_id in jobs else {'status': 'pending'}
+        for file_id, task_id in batch['tasks'].items()
+    }
+    return FastJsonResponse({
+        'batch_id': batch_id,
+        'progress': summarize_batch(statuses),
+        'tasks': statuses,
+        'rejected': batch['rejected'],
+    })
     
 
 @login_required
@@ -44,25 +106,71 @@ def teardown_view(request, deployment_id):
             'message': 'Deployment is already inactive.'
         })
     
-    # Start the teardown process
-    task = teardown_chat_app.apply_async(args=[request.user.id, deployment_id])  # Pass the deployment ID to the task
-    return JsonResponse({'task_id': task.id})
+    # Start the teardown process, or attach to the one already running for this deployment
+    dedup_key = teardown_key(deployment_id)
+    task_id, created = claim(dedup_key)
+    if created:
+        job = new_job(task_id, 'teardown', request.user.id, deployment_id)
+        job.save()
+        try:
+            teardown_chat_app.apply_async(args=[request.user.id, deployment_id], task_id=task_id)  # Pass the deployment ID to the task
+        except Exception:
+            job.delete()
+            release(dedup_key, task_id)
+            raise
+    return JsonResponse({'task_id': task_id, 'duplicate': not created})
 
 @login_required
 def teardown_status_view(request, task_id):
-    task = teardown_chat_app.AsyncResult(task_id)
-    if task.state == 'SUCCESS':
-        result = task.result
-        if result.get('status') == 'completed':
-            return JsonResponse({
-                'status': 'completed',
-                'deployment_status': result.get('deployment_status'),
-                'endpoint': result.get('endpoint'),
-                'message': 'Teardown completed successfully.'
-            })
-        else:
-            return JsonResponse({'status': 'failed', 'error': result.get('error', 'Unknown error')})
-    elif task.state == 'FAILURE':
-        return JsonResponse({'status': 'failed', 'error': str(task.info)})
-    else:
-        return JsonResponse({'status': 'pending'})
\ No newline at end of file
+    return job_status_response(request, task_id, 'teardown')
+
+@login_required
+def task_status_view(request):
+    """
+    Status of many of the user's tasks in one request, resolved with a single Redis read.
+    Only tasks that changed since the client's cursor are returned, along with the next cursor.
+    """
+    query = parse_task_status_query(request)
+    if query is None:
+        return JsonResponse({'error': f'Provide between 1 and {settings.TASK_STATUS_MAX_IDS} task IDs and a valid cursor.'}, status=400)
+    if not settings.REDIS_URL:
+        return JsonResponse({'error': 'Batched task status requires REDIS_URL.'}, status=503)
+
+    states, cursor = task_states(request.user.id, *query)
+    return FastJsonResponse({'cursor': cursor, 'tasks': states})
+
+@login_required
+def bulk_teardown_view(request):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required.'}, status=405)
+    valid, deployment_ids = parse_bulk_teardown(request)
+    if not valid:
+        return JsonResponse({'error': 'Provide deployment_ids or "all": true.'}, status=400)
+
+    task_id = str(uuid.uuid4())
+    job = new_job(task_id, 'bulk_teardown', request.user.id, bulk_teardown_target(deployment_ids))
+    job.save()
+    try:
+        bulk_teardown_chat_apps.apply_async(args=[request.user.id, deployment_ids], task_id=task_id)
+    except Exception:
+        job.delete()
+        raise
+    return JsonResponse({'task_id': task_id})
+
+@login_required
+def bulk_teardown_status_view(request, task_id):
+    return job_status_response(request, task_id, 'bulk_teardown')
+
+async def task_events_view(request):
+    """Streams status updates for all of the user's tasks as Server-Sent Events. Served by the ASGI app."""
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required.'}, status=401)
+    if not settings.REDIS_URL:
+        # 204 tells EventSource not to reconnect; the page falls back to polling
+        return HttpResponse(status=204)
+
+    response = StreamingHttpResponse(stream_task_events(user.id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
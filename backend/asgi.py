@@ -2,6 +2,8 @@
 ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+In production it is run by uvicorn (the ``events`` service) to serve the task
+event stream at /account/events/; all other views stay on gunicorn.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
@@ -1,7 +1,10 @@
 from __future__ import absolute_import, unicode_literals
 import os
 from celery import Celery
+from celery.signals import worker_process_init, worker_init, worker_process_shutdown, task_prerun, task_postrun
+from datetime import datetime
 import logging
+import time
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings.production')
@@ -34,6 +37,68 @@ logger.addHandler(handler)
 logger.setLevel(logging.DEBUG)
 
 
+@worker_process_init.connect
+def init_aws_clients(**kwargs):
+    """Builds the pooled AWS clients once per worker process so tasks don't pay for client setup."""
+    from backend.accounts.deployment.aws_utils.clients import registry
+    registry.reset()
+    if os.environ.get('AWS_REGION'):
+        registry.warm(['lambda', 'apigateway', 's3'])
+
+
+# Start times of the tasks running in this process, for the duration histogram
+_task_started = {}
+
+
+@worker_init.connect
+def start_metrics_exporter(**kwargs):
+    """
+    Serves this worker's metrics on CELERY_METRICS_PORT from the main process. Prefork children
+    write to PROMETHEUS_MULTIPROC_DIR, which is cleared here before they start. Port 0 disables it.
+    """
+    port = int(os.environ.get('CELERY_METRICS_PORT', 9808))
+    if not port:
+        return
+    from prometheus_client import start_http_server
+    from backend.accounts import metrics
+    metrics.reset_multiprocess_dir()
+    registry = metrics.exposition_registry()
+    queues = [queue.name for queue in app.amqp.queues.consume_from.values()]
+    registry.register(metrics.QueueDepthCollector(app, queues))
+    start_http_server(port, registry=registry)
+    logger.info(f"Serving Celery metrics on port {port} for queues {queues}")
+
+
+@worker_process_shutdown.connect
+def mark_metrics_process_dead(pid=None, **kwargs):
+    from backend.accounts.metrics import mark_process_dead
+    mark_process_dead(pid or os.getpid())
+
+
+@task_prerun.connect
+def observe_task_wait(task_id=None, task=None, **kwargs):
+    from backend.accounts.metrics import TASK_WAIT_SECONDS
+    _task_started[task_id] = time.monotonic()
+    published_at = getattr(task.request, 'published_at', None)
+    if published_at is None:
+        return
+    eta = task.request.eta
+    if eta:
+        # Countdown retries aren't queueing delay; measure from when the task became due
+        eta = datetime.fromisoformat(eta) if isinstance(eta, str) else eta
+        published_at = max(published_at, eta.timestamp())
+    queue = (task.request.delivery_info or {}).get('routing_key') or 'unknown'
+    TASK_WAIT_SECONDS.labels(task.name, queue).observe(max(0, time.time() - published_at))
+
+
+@task_postrun.connect
+def observe_task_duration(task_id=None, task=None, state=None, **kwargs):
+    from backend.accounts.metrics import TASK_SECONDS
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        TASK_SECONDS.labels(task.name, state or 'UNKNOWN').observe(time.monotonic() - started)
+
+
 @app.task(bind=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
\ No newline at end of file
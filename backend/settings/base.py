@@ -23,6 +23,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'backend.accounts.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -86,6 +87,16 @@ LOGIN_REDIRECT_URL = 'home'
 LOGIN_URL = 'login'
 LOGOUT_REDIRECT_URL = 'login'
 
+# Shared cache used to coordinate work across gunicorn and Celery processes
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+
 CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL')
 CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', 'rpc://')
 CELERY_ACCEPT_CONTENT = ['json']
@@ -93,6 +104,58 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
 
+# Deploys spend minutes polling AWS, so they get their own queue and workers and can't hold up
+# teardowns or short housekeeping tasks. Anything unrouted goes to 'light'.
+CELERY_TASK_DEFAULT_QUEUE = 'light'
+CELERY_TASK_ROUTES = {
+    'backend.accounts.tasks.deploy_chat_app': {'queue': 'deploy'},
+    'backend.accounts.tasks.teardown_chat_app': {'queue': 'teardown'},
+    'backend.accounts.tasks.bulk_teardown_chat_apps': {'queue': 'teardown'},
+}
+# Each worker consumes the queues in CELERY_QUEUES; set these per worker
+CELERY_WORKER_PREFETCH_MULTIPLIER = int(os.environ.get('CELERY_PREFETCH_MULTIPLIER', 4))
+CELERY_WORKER_CONCURRENCY = int(os.environ['CELERY_CONCURRENCY']) if os.environ.get('CELERY_CONCURRENCY') else None
+# Per-worker token buckets on task starts; the account-wide AWS call budgets live in aws_utils/clients.py
+CELERY_TASK_ANNOTATIONS = {
+    'backend.accounts.tasks.deploy_chat_app': {'rate_limit': os.environ.get('DEPLOY_TASK_RATE_LIMIT', '30/m')},
+    'backend.accounts.tasks.teardown_chat_app': {'rate_limit': os.environ.get('TEARDOWN_TASK_RATE_LIMIT', '60/m')},
+}
+
+# Deploy fan-out limits, enforced across all workers
+DEPLOY_MAX_CONCURRENCY = int(os.environ.get('DEPLOY_MAX_CONCURRENCY', 10))
+DEPLOY_MAX_CONCURRENCY_PER_USER = int(os.environ.get('DEPLOY_MAX_CONCURRENCY_PER_USER', 3))
+DEPLOY_SLOT_LEASE = int(os.environ.get('DEPLOY_SLOT_LEASE', 900))
+DEPLOY_SLOT_RETRY_DELAY = int(os.environ.get('DEPLOY_SLOT_RETRY_DELAY', 10))
+# A deploy still waiting for a slot after this many retries (about retries x delay seconds) fails its job
+DEPLOY_SLOT_MAX_RETRIES = int(os.environ.get('DEPLOY_SLOT_MAX_RETRIES', 90))
+BULK_DEPLOY_MAX_FILES = int(os.environ.get('BULK_DEPLOY_MAX_FILES', 100))
+BULK_BATCH_TTL = 60 * 60 * 24
+TASK_STATUS_MAX_IDS = 200
+LIBRARY_PAGE_SIZE = int(os.environ.get('LIBRARY_PAGE_SIZE', 50))
+# Cursor-paginated REST lists (files/, deployments/list/); clients may ask for up to the max with ?page_size=
+API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', 100))
+API_MAX_PAGE_SIZE = 1000
+# Per-user cache of list pages and rendered fragments (pagecache.py), invalidated by the user's change
+# version. Off without Redis: a per-process cache would miss the version bumps made by Celery workers.
+USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 300)) if REDIS_URL else 0
+# How long a deploy/teardown idempotency key stays claimed if its task never finishes
+TASK_DEDUP_LEASE = int(os.environ.get('TASK_DEDUP_LEASE', 900))
+# Deploy/teardown job records are kept this long, then removed by the prune_deployment_jobs task
+DEPLOYMENT_JOB_RETENTION_DAYS = int(os.environ.get('DEPLOYMENT_JOB_RETENTION_DAYS', 30))
+DEPLOYMENT_JOB_PRUNE_BATCH = 5000
+CELERY_BEAT_SCHEDULE = {
+    'prune-deployment-jobs': {
+        'task': 'backend.accounts.tasks.prune_deployment_jobs',
+        'schedule': 60 * 60 * 24,
+    },
+}
+
+# Request profiling (backend/accounts/profiling.py): staff send X-Profile: 1, load tests send the token
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_HEADER_TOKEN = os.environ.get('PROFILE_HEADER_TOKEN')
+PROFILE_REPORT_SIZE = 500
+PROFILE_REPEATED_QUERY_THRESHOLD = 10
+
 
 # settings.py
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
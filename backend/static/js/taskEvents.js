@@ -0,0 +1,118 @@
+/**
+ * taskEvents.js
+ *
+ * Delivers deploy and teardown status updates to the page over a single Server-Sent Events
+ * connection (/account/events/) instead of one polling loop per task.
+ *
+ * Functions:
+ * - TaskEvents.waitForTask(taskId, statusUrl, onProgress): Resolves with the task's final status
+ *   (the same payload the status views return). onProgress, if given, receives pending updates
+ *   such as the current deploy stage.
+ *
+ * Notes:
+ * - The stream replays the latest state of the user's recent tasks on connect, so a task that
+ *   finished before the page started waiting still resolves.
+ * - If the server answers the stream with 204 (no Redis, or the mock views), or the browser has no
+ *   EventSource, all waiting tasks are polled every 5 seconds with one request to
+ *   /account/task_status/. If that endpoint is unavailable too, each task's statusUrl is polled.
+ */
+const TaskEvents = (() => {
+    const waiters = new Map();   // taskId -> {resolve, statusUrl, onProgress}
+    const finished = new Map();  // taskId -> final status that arrived before anyone waited for it
+    let source = null;
+    let unavailable = !window.EventSource;
+    let polling = false;
+    let batched = true;
+    let cursor = 0;
+    let polledIds = '';
+
+    function deliver(data) {
+        const waiter = waiters.get(data.task_id);
+        if (data.status === 'pending') {
+            if (waiter && waiter.onProgress) waiter.onProgress(data);
+        } else if (waiter) {
+            waiters.delete(data.task_id);
+            waiter.resolve(data);
+        } else {
+            finished.set(data.task_id, data);
+        }
+    }
+
+    function connect() {
+        if (source || unavailable) return;
+        source = new EventSource('/account/events/');
+
+        source.addEventListener('task', (event) => deliver(JSON.parse(event.data)));
+
+        source.addEventListener('error', () => {
+            // The browser reconnects on its own unless the server refused the stream
+            if (source.readyState === EventSource.CLOSED) {
+                unavailable = true;
+                source = null;
+                startPolling();
+            }
+        });
+    }
+
+    async function pollBatch() {
+        const ids = [...waiters.keys()].join(',');
+        if (ids !== polledIds) {
+            // New tasks may have changed before the current cursor, so ask for everything once
+            cursor = 0;
+            polledIds = ids;
+        }
+        const response = await fetch(`/account/task_status/?ids=${encodeURIComponent(ids)}&cursor=${cursor}`);
+        if (!response.ok) return false;
+        const data = await response.json();
+        cursor = data.cursor;
+        Object.entries(data.tasks).forEach(([taskId, state]) => deliver({ ...state, task_id: taskId }));
+        return true;
+    }
+
+    async function pollEach() {
+        await Promise.all([...waiters].map(async ([taskId, waiter]) => {
+            const response = await fetch(waiter.statusUrl);
+            deliver({ ...(await response.json()), task_id: taskId });
+        }));
+    }
+
+    function startPolling() {
+        if (polling) return;
+        polling = true;
+        const check = async () => {
+            if (!waiters.size) {
+                polling = false;
+                return;
+            }
+            try {
+                if (!(batched && await pollBatch())) {
+                    batched = false;
+                    await pollEach();
+                }
+            } catch (error) {
+                console.error('Error:', error);
+            }
+            setTimeout(check, 5000);
+        };
+        check();
+    }
+
+    function waitForTask(taskId, statusUrl, onProgress) {
+        return new Promise((resolve) => {
+            if (finished.has(taskId)) {
+                const data = finished.get(taskId);
+                finished.delete(taskId);
+                resolve(data);
+                return;
+            }
+            waiters.set(taskId, { resolve, statusUrl, onProgress });
+            if (unavailable) {
+                startPolling();
+            } else {
+                connect();
+            }
+        });
+    }
+
+    return { waitForTask };
+})();
@@ -13,6 +13,7 @@ else:
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', views.metrics_view, name='metrics'),
     
     # API endpoints
     path('api/accounts/', include('backend.accounts.urls')),
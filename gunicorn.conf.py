@@ -0,0 +1,11 @@
+# Gunicorn hooks for Prometheus multiprocess metrics; other settings are passed on the command line
+from backend.accounts.metrics import reset_multiprocess_dir, mark_process_dead
+
+
+def on_starting(server):
+    # Metric files from a previous run would otherwise be aggregated into the new one
+    reset_multiprocess_dir()
+
+
+def child_exit(server, worker):
+    mark_process_dead(worker.pid)
@@ -15,7 +15,7 @@ if [ "$DJANGO_ENV" = "development" ]; then
     python manage.py runserver 0.0.0.0:8000 &
 else
     echo "Starting Gunicorn"
-    gunicorn backend.wsgi:application --bind 0.0.0.0:8000 --timeout 120 --log-level debug &
+    gunicorn backend.wsgi:application --config gunicorn.conf.py --bind 0.0.0.0:8000 --timeout 120 --log-level debug &
 fi
 
 # Wait and keep the container running